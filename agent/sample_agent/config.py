@@ -2,6 +2,11 @@
 This module handles tool initialization and model settings.
 """
 
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
 from typing import Any
 from langchain_core.tools import StructuredTool
 from langchain_mcp_adapters.client import MultiServerMCPClient
@@ -93,19 +98,92 @@ def action_to_tool(tool):
 from sample_agent.mcp.config import mcp_mapping_config
 
 
+class ToolCache:
+    """已构建的工具列表缓存，避免每轮对话都重新包装 CopilotKit actions 和校验参数 schema
+
+    键为 (MCP 服务地址, MCP 工具列表版本, actions 哈希)。MCP 工具列表版本取工具对象的 id，
+    连接池重新连接后工具对象会变化，缓存条目持有这些工具对象，id 在条目有效期内不会被复用。
+    条目超过 ttl 秒后失效，超过 max_entries 个时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def make_key(mcp_client: MultiServerMCPClient, mcp_tools: list, actions: list):
+        servers = tuple(
+            sorted(
+                (name, str(conn.get("url") or conn.get("command") or ""))
+                for name, conn in (mcp_client.connections or {}).items()
+            )
+        )
+        tools_version = tuple(id(tool) for tool in mcp_tools)
+        actions_hash = hashlib.sha256(
+            json.dumps(actions, sort_keys=True, ensure_ascii=False, default=str).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+        return servers, tools_version, actions_hash
+
+    def get(self, key) -> list | None:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, tools: list) -> None:
+        self._entries[key] = (time.monotonic(), tools)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+        }
+
+
+tool_cache = ToolCache(
+    ttl=float(os.getenv("TOOL_CACHE_TTL_SECONDS", "600")),
+    max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "128")),
+)
+
+
 # Tool initialization with error handling
 async def initialize_tools(mcp_client: MultiServerMCPClient, actions: list) -> list:
 
     mcp_tools = mcp_client.get_tools()
-    mcp_tools.extend([action_to_tool(tool) for tool in actions])
-    # Add memory management tools
-    memory_tools = [
-        # create_manage_memory_tool(namespace=("memories",)),
-        # create_search_memory_tool(namespace=("memories",)),
-    ]
-
-    tools = memory_tools + mcp_tools
-
-    if not tools:
-        return []
-    return tools
+    key = tool_cache.make_key(mcp_client, mcp_tools, actions)
+    tools = tool_cache.get(key)
+    if tools is None:
+        mcp_tools = list(mcp_tools)
+        mcp_tools.extend([action_to_tool(tool) for tool in actions])
+        # Add memory management tools
+        memory_tools = [
+            # create_manage_memory_tool(namespace=("memories",)),
+            # create_search_memory_tool(namespace=("memories",)),
+        ]
+
+        tools = memory_tools + mcp_tools
+        tool_cache.put(key, tools)
+
+    # 返回副本，调用方会在列表上追加交接工具
+    return list(tools)
@@ -0,0 +1,256 @@
+"""进程级 MCP 客户端连接池
+
+每次图调用都新建 MultiServerMCPClient 需要重新建立 SSE 连接、完成 MCP initialize 握手并
+list_tools。连接池按规范化后的 mcp_config 复用已连接的客户端：
+
+- 每个客户端由一个独立的后台任务进入和退出 ``async with MultiServerMCPClient``，
+  SSE / stdio 连接的 cancel scope 必须在同一个任务中进入和退出，使用方只借用已连接的会话
+- 借出时如果距离上次健康检查超过 MCP_POOL_PING_SECONDS，先对每个会话 ping 一次，
+  失败或连接已断开时重新连接
+- 后台清理任务定期 ping 空闲的客户端，关闭空闲超过 MCP_POOL_IDLE_SECONDS 的客户端，
+  客户端数量超过 MCP_POOL_MAX_CLIENTS 时关闭最久未使用的空闲客户端
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+# 设置为 0 时不使用连接池，每次调用都新建客户端
+MCP_POOL_ENABLED = os.getenv("MCP_POOL_ENABLED", "1") != "0"
+# 空闲多久后关闭客户端（秒）
+MCP_POOL_IDLE_SECONDS = float(os.getenv("MCP_POOL_IDLE_SECONDS", "600"))
+# 健康检查间隔（秒），以及单次 ping 和建立连接的超时时间
+MCP_POOL_PING_SECONDS = float(os.getenv("MCP_POOL_PING_SECONDS", "30"))
+MCP_POOL_PING_TIMEOUT = float(os.getenv("MCP_POOL_PING_TIMEOUT", "5"))
+MCP_POOL_CONNECT_TIMEOUT = float(os.getenv("MCP_POOL_CONNECT_TIMEOUT", "30"))
+# 最多保留的客户端数量，不同的 mcp_config（例如不同用户的请求头）各占一个
+MCP_POOL_MAX_CLIENTS = int(os.getenv("MCP_POOL_MAX_CLIENTS", "32"))
+
+
+def config_key(mcp_config: Optional[Dict[str, Any]]) -> str:
+    """规范化 mcp_config 并计算哈希，键的顺序不影响结果"""
+    normalized = json.dumps(
+        mcp_config or {}, sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class PooledClient:
+    """连接池中的一个 MultiServerMCPClient，由自己的后台任务持有连接"""
+
+    def __init__(self, mcp_config: Dict[str, Any]):
+        self.mcp_config = mcp_config
+        self.client: Optional[MultiServerMCPClient] = None
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.checked_at = time.monotonic()
+        self._ready: Optional[asyncio.Future] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def closed(self) -> bool:
+        """后台任务已退出，或正在退出（已清空 client）"""
+        return self._task is None or self._task.done() or self.client is None
+
+    async def start(self) -> None:
+        """在后台任务中建立连接，等待握手和 list_tools 完成"""
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        self._closing = asyncio.Event()
+        self._task = loop.create_task(self._hold())
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self._ready), timeout=MCP_POOL_CONNECT_TIMEOUT
+            )
+        except BaseException:
+            await self.close()
+            raise
+        self.checked_at = time.monotonic()
+
+    async def _hold(self) -> None:
+        try:
+            async with MultiServerMCPClient(self.mcp_config) as client:
+                self.client = client
+                self._ready.set_result(None)
+                await self._closing.wait()
+        except BaseException as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                print(f"Warning: MCP 连接已断开: {e}")
+        finally:
+            self.client = None
+
+    async def ping(self) -> bool:
+        """对所有会话发送 ping，任何一个失败都视为不可用"""
+        client = self.client
+        if self.closed or client is None:
+            return False
+        try:
+            for session in client.sessions.values():
+                await asyncio.wait_for(
+                    session.send_ping(), timeout=MCP_POOL_PING_TIMEOUT
+                )
+        except Exception as e:
+            print(f"Warning: MCP 健康检查失败，将重新连接: {e}")
+            return False
+        self.checked_at = time.monotonic()
+        return True
+
+    async def close(self) -> None:
+        """通知后台任务退出 async with，由它关闭连接"""
+        if self._task is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self._task), timeout=MCP_POOL_PING_TIMEOUT
+            )
+        except BaseException:
+            self._task.cancel()
+
+
+class MCPClientPool:
+    """按 mcp_config 复用 MultiServerMCPClient 的进程级连接池
+
+    用法与 ``async with MultiServerMCPClient(mcp_config)`` 相同::
+
+        async with mcp_client_pool.session(mcp_config) as mcp_client:
+            tools = await initialize_tools(mcp_client, actions)
+
+    客户端可以被多个图调用同时借用，MCP 会话按请求编号区分并发请求。
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, PooledClient] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reaper: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "connects": 0, "reconnects": 0, "evictions": 0}
+
+    def _bind_loop(self) -> None:
+        """连接只能在创建它的事件循环中使用，事件循环变化时丢弃旧的连接"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._clients = {}
+        self._locks = {}
+        self._reaper = loop.create_task(self._reap())
+
+    @asynccontextmanager
+    async def session(
+        self, mcp_config: Optional[Dict[str, Any]]
+    ) -> AsyncIterator[MultiServerMCPClient]:
+        """借出一个已连接的客户端，退出时归还，连接保持打开"""
+        if not MCP_POOL_ENABLED:
+            async with MultiServerMCPClient(mcp_config) as client:
+                yield client
+            return
+        entry = await self._acquire(mcp_config or {})
+        if entry.closed:
+            # 借出过程中后台任务退出了连接，归还后重新连接一次
+            entry.in_use -= 1
+            entry = await self._acquire(mcp_config or {})
+            if entry.closed:
+                entry.in_use -= 1
+                raise RuntimeError("MCP 连接在借出时断开，重新连接后仍不可用")
+        try:
+            yield entry.client
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    async def _acquire(self, mcp_config: Dict[str, Any]) -> PooledClient:
+        self._bind_loop()
+        key = config_key(mcp_config)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                stale = time.monotonic() - entry.checked_at > MCP_POOL_PING_SECONDS
+                if entry.closed or (stale and not await entry.ping()):
+                    self._clients.pop(key, None)
+                    await entry.close()
+                    entry = None
+                    self.stats["reconnects"] += 1
+                else:
+                    self.stats["hits"] += 1
+            if entry is None:
+                entry = PooledClient(mcp_config)
+                await entry.start()
+                self._clients[key] = entry
+                self.stats["connects"] += 1
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+        await self._evict_overflow()
+        return entry
+
+    async def _evict_overflow(self) -> None:
+        """客户端数量超过上限时，关闭最久未使用的空闲客户端"""
+        overflow = len(self._clients) - MCP_POOL_MAX_CLIENTS
+        if overflow <= 0:
+            return
+        idle = sorted(
+            (entry.last_used, key)
+            for key, entry in self._clients.items()
+            if entry.in_use == 0
+        )
+        for _, key in idle[:overflow]:
+            await self._evict(key)
+
+    async def _evict(self, key: str) -> None:
+        entry = self._clients.pop(key, None)
+        if entry is not None:
+            self.stats["evictions"] += 1
+            await entry.close()
+
+    async def _reap(self) -> None:
+        """定期关闭空闲过久的客户端，并对其余空闲客户端做健康检查"""
+        while True:
+            await asyncio.sleep(MCP_POOL_PING_SECONDS)
+            try:
+                await self._reap_once()
+            except Exception as e:
+                print(f"Warning: MCP 连接池清理失败: {e}")
+
+    async def _reap_once(self) -> None:
+        now = time.monotonic()
+        for key, entry in list(self._clients.items()):
+            lock = self._locks.get(key)
+            if entry.in_use or lock is None or lock.locked():
+                continue
+            async with lock:
+                if self._clients.get(key) is not entry or entry.in_use:
+                    continue
+                if now - entry.last_used > MCP_POOL_IDLE_SECONDS:
+                    await self._evict(key)
+                elif not await entry.ping():
+                    # 下次借出时重新连接
+                    await self._evict(key)
+
+    async def close(self) -> None:
+        """关闭所有客户端和后台清理任务，在服务退出时由 sample_agent.webapp 的 lifespan 调用
+
+        连接属于创建它的事件循环，在其他事件循环中调用时只丢弃引用
+        """
+        same_loop = self._loop is asyncio.get_running_loop()
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if same_loop:
+            for key in list(self._clients):
+                await self._evict(key)
+        self._clients = {}
+        self._locks = {}
+        self._loop = None
+
+
+mcp_client_pool = MCPClientPool()
@@ -1,9 +1,9 @@
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_core.runnables import RunnableConfig
 from sample_agent.state import SuperAgentState
 from sample_agent.config import store, initialize_tools
 from sample_agent.model_factory import create_chat_model
 from sample_agent.utils import process_mcp_config_headers
+from sample_agent.mcp.pool import mcp_client_pool
 from langgraph.prebuilt import create_react_agent
 from sample_agent.swarm import create_handoff_tool
 from langgraph.func import entrypoint
@@ -17,7 +17,8 @@ async def all_helper(state: SuperAgentState, config: RunnableConfig):
     mcp_config = process_mcp_config_headers(state.get("mcp_config"))
     actions = state.get("copilotkit", {}).get("actions", [])
 
-    async with MultiServerMCPClient(mcp_config) as mcp_client:
+    # 复用连接池中已完成握手的 MCP 客户端
+    async with mcp_client_pool.session(mcp_config) as mcp_client:
         # Initialize tools with error handling
         tools = await initialize_tools(mcp_client, actions)
         tools += [create_handoff_tool(agent_name="data_expert")]
@@ -1,5 +1,4 @@
 from typing import Dict, Any
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_core.runnables import RunnableConfig
 from sample_agent.state import SuperAgentState
 from sample_agent.config import store, initialize_tools
@@ -10,6 +9,7 @@ from sample_agent.model_factory import (
 )
 from sample_agent.expert.create_expert_agent_v2 import create_expert_agent
 from sample_agent.utils import process_mcp_config_headers
+from sample_agent.mcp.pool import mcp_client_pool
 from langgraph.func import entrypoint
 
 
@@ -20,7 +20,8 @@ async def data_expert(state: SuperAgentState, config: RunnableConfig):
     """
     mcp_config = process_mcp_config_headers(state.get("mcp_config"))
     actions = state.get("copilotkit", {}).get("actions", [])
-    async with MultiServerMCPClient(mcp_config) as mcp_client:
+    # 复用连接池中已完成握手的 MCP 客户端
+    async with mcp_client_pool.session(mcp_config) as mcp_client:
         # 初始化工具
         tools = await initialize_tools(mcp_client, actions)
         expert = create_expert_agent(
@@ -52,6 +53,7 @@ async def data_expert(state: SuperAgentState, config: RunnableConfig):
         - 可以多次使用工具
         - **仅能**使用查看和分析类工具。**严禁**使用任何具有写入、修改或删除数据功能的工具。
         - 记得先观察文件(list_worksheets)和列信息，以防止出错
+        - 优先使用 `batch_analyze` 在一次调用中完成列信息、缺失值、唯一值、数值统计和抽样等多个观察操作，减少工具调用次数
         - 总工具使用次数限制在 10 次以内。
     - 根据观察到的数据，生成一份关于数据情况、潜在问题和分析机会的全面报告
     - 注意，你不需要执行任何任务，只需要生成报告
@@ -60,7 +62,7 @@ async def data_expert(state: SuperAgentState, config: RunnableConfig):
         - 需要执行任务，请找 **execute_agent** 帮助
 
 3. 数据探索方法：
-    - 必须使用 `get_random_sample` 工具来抽样观察原始数据。如果一次抽样不足以发现问题，可以多次使用（但要注意总次数限制）。
+    - 必须抽样观察原始数据，可以在 `batch_analyze` 中加入多个 sample 操作，或者使用 `get_random_sample` 工具。如果一次抽样不足以发现问题，可以多次抽样（但要注意总次数限制）。
     - 每一列都是应该是一个独立的列，而不是合并的数据
     - 你可以发挥主观能动性，从样本中观察到的原始数据值中提取信息。
 
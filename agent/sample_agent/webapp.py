@@ -0,0 +1,21 @@
+"""LangGraph 服务的自定义 HTTP 应用，在 langgraph.json 的 http.app 中注册
+
+不添加路由，只通过 lifespan 在服务退出时关闭 MCP 连接池中的 SSE / stdio 会话和后台清理任务
+"""
+
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+
+from sample_agent.mcp.pool import mcp_client_pool
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    try:
+        yield
+    finally:
+        await mcp_client_pool.close()
+
+
+app = Starlette(lifespan=lifespan)
@@ -0,0 +1,173 @@
+import os
+import logging
+from typing import List, Optional, Union
+
+import pandas as pd
+
+from .groupby import group_keys
+
+logger = logging.getLogger("excel-mcp")
+
+# 大文件使用的 DataFrame 后端：pandas、modin（dask 引擎）或 dask
+DATAFRAME_BACKEND = os.environ.get("EXCEL_DATAFRAME_BACKEND", "pandas").lower()
+# 文件大小超过该阈值时才切换到分区后端，小文件始终使用 pandas
+BACKEND_THRESHOLD_BYTES = (
+    int(os.environ.get("EXCEL_BACKEND_THRESHOLD_MB", "256")) * 1024 * 1024
+)
+# 分区数量，默认为 CPU 核数
+BACKEND_PARTITIONS = int(
+    os.environ.get("EXCEL_BACKEND_PARTITIONS", str(os.cpu_count() or 1))
+)
+
+
+class PandasBackend:
+    """单机内存后端，也是其他后端的接口定义
+
+    后端接收 ExcelDataHandler 和文件路径，自行决定如何加载数据，
+    返回的结果统一为 pandas 对象。
+    """
+
+    name = "pandas"
+
+    def load(
+        self,
+        handler,
+        filepath: str,
+        sheet_name: Optional[str],
+        columns: Optional[List[str]] = None,
+    ):
+        return handler.read_data(
+            handler.get_file_path(filepath),
+            sheet_name=sheet_name,
+            columns=columns,
+            readonly=True,
+        )
+
+    def to_pandas(self, obj):
+        return obj
+
+    def numeric_columns(self, frame) -> List[str]:
+        return frame.select_dtypes(include="number").columns.tolist()
+
+    def numeric_stats(
+        self, handler, filepath: str, sheet_name: Optional[str], columns: List[str]
+    ) -> pd.DataFrame:
+        """计算 describe() 统计及总和"""
+        frame = self.load(handler, filepath, sheet_name, columns)
+        columns = columns if columns is not None else self.numeric_columns(frame)
+        stats = self.to_pandas(frame[columns].describe())
+        stats.loc["sum"] = self.to_pandas(
+            frame[columns].sum(numeric_only=True, skipna=True)
+        )
+        return stats
+
+    def group_stats(
+        self,
+        handler,
+        filepath: str,
+        sheet_name: Optional[str],
+        group_by: Union[str, List[str]],
+        agg_columns: List[str],
+        agg_functions: List[str],
+    ) -> pd.DataFrame:
+        """按列分组并聚合"""
+        frame = self.load(
+            handler,
+            filepath,
+            sheet_name,
+            list(dict.fromkeys(group_keys(group_by) + agg_columns)),
+        )
+        return self.to_pandas(frame.groupby(group_by)[agg_columns].agg(agg_functions))
+
+
+class ModinBackend(PandasBackend):
+    """modin 后端，使用 dask 引擎在所有核心上并行执行 pandas API"""
+
+    name = "modin"
+
+    def __init__(self):
+        os.environ.setdefault("MODIN_ENGINE", "dask")
+        import modin.pandas as mpd
+
+        self.mpd = mpd
+
+    def load(
+        self,
+        handler,
+        filepath: str,
+        sheet_name: Optional[str],
+        columns: Optional[List[str]] = None,
+    ):
+        full_path = handler.get_file_path(filepath)
+        if full_path.lower().endswith(".csv"):
+            return self.mpd.read_csv(full_path, usecols=columns)
+        return self.mpd.DataFrame(super().load(handler, filepath, sheet_name, columns))
+
+    def to_pandas(self, obj):
+        from modin.utils import to_pandas
+
+        return to_pandas(obj)
+
+
+class DaskBackend(PandasBackend):
+    """dask.dataframe 后端，CSV 按块读取实现内存外计算，Excel 在内存中分区并行
+
+    注意 dask 的 describe() 分位数为近似值
+    """
+
+    name = "dask"
+
+    def __init__(self):
+        import dask.dataframe as dd
+
+        self.dd = dd
+
+    def load(
+        self,
+        handler,
+        filepath: str,
+        sheet_name: Optional[str],
+        columns: Optional[List[str]] = None,
+    ):
+        full_path = handler.get_file_path(filepath)
+        if full_path.lower().endswith(".csv"):
+            return self.dd.read_csv(full_path, blocksize="64MB", usecols=columns)
+        return self.dd.from_pandas(
+            super().load(handler, filepath, sheet_name, columns),
+            npartitions=BACKEND_PARTITIONS,
+        )
+
+    def to_pandas(self, obj):
+        return obj.compute()
+
+
+BACKENDS = {
+    "pandas": PandasBackend,
+    "modin": ModinBackend,
+    "dask": DaskBackend,
+}
+
+_instances = {}
+
+
+def get_backend(filepath: str) -> Optional[PandasBackend]:
+    """根据部署配置和文件大小选择后端
+
+    Returns:
+        Optional[PandasBackend]: 需要使用分区后端时返回实例，否则返回 None，
+        调用方继续使用默认的 pandas 路径（列画像、流式处理等）
+    """
+    if DATAFRAME_BACKEND == "pandas" or DATAFRAME_BACKEND not in BACKENDS:
+        return None
+    try:
+        if os.path.getsize(filepath) < BACKEND_THRESHOLD_BYTES:
+            return None
+    except OSError:
+        return None
+    if DATAFRAME_BACKEND not in _instances:
+        try:
+            _instances[DATAFRAME_BACKEND] = BACKENDS[DATAFRAME_BACKEND]()
+        except ImportError as e:
+            logger.warning(f"无法加载 {DATAFRAME_BACKEND} 后端，使用 pandas: {e}")
+            _instances[DATAFRAME_BACKEND] = None
+    return _instances[DATAFRAME_BACKEND]
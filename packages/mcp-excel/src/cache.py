@@ -0,0 +1,233 @@
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger("excel-mcp")
+
+# 所有缓存的键都以 (filepath, mtime, ...) 开头，便于按文件失效
+CacheKey = Tuple[Hashable, ...]
+
+_registry: Dict[str, "MemoryCache"] = {}
+
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数类型的环境变量，无法解析时使用默认值"""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"环境变量 {name}={value} 不是整数，使用默认值 {default}")
+        return default
+
+
+def estimate_size(value: Any) -> int:
+    """估算缓存对象占用的内存字节数
+
+    DataFrame 使用 memory_usage(deep=True)，可以统计 object 列中字符串的真实占用；
+    dict / list / tuple / set 递归累加其中的元素（如列画像），被多处引用的对象只计一次
+    """
+    return _estimate_size(value, set())
+
+
+def _estimate_size(value: Any, seen: set) -> int:
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            _estimate_size(k, seen) + _estimate_size(v, seen) for k, v in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_estimate_size(item, seen) for item in value)
+    return size
+
+
+class MemoryCache:
+    """带字节预算的内存缓存，支持 LRU / LFU 淘汰策略
+
+    键的前两项必须是 (filepath, mtime)，这样可以在文件被重写后清理旧版本的条目。
+    """
+
+    POLICIES = ("lru", "lfu")
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int,
+        max_entries: int = 0,
+        policy: str = "lru",
+        sizeof: Callable[[Any], int] = estimate_size,
+    ):
+        """
+        Args:
+            name: 缓存名称，用于统计输出
+            max_bytes: 字节预算，超过后按策略淘汰；0 表示禁用缓存
+            max_entries: 最大条目数，0 表示不限制
+            policy: 淘汰策略，'lru' 或 'lfu'
+            sizeof: 计算条目大小的函数
+        """
+        if policy not in self.POLICIES:
+            logger.warning(f"未知的缓存策略 {policy}，使用 lru")
+            policy = "lru"
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = policy
+        self.sizeof = sizeof
+        # key -> [value, size, frequency]，OrderedDict 的顺序即最近使用顺序
+        self._entries: "OrderedDict[CacheKey, list]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        _registry[name] = self
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        prefix: str,
+        max_mb: int,
+        max_entries: int = 0,
+        policy: str = "lru",
+        **kwargs,
+    ) -> "MemoryCache":
+        """根据环境变量 {prefix}_MAX_MB / {prefix}_MAX_ENTRIES / {prefix}_POLICY 创建缓存"""
+        return cls(
+            name,
+            max_bytes=_env_int(f"{prefix}_MAX_MB", max_mb) * 1024 * 1024,
+            max_entries=_env_int(f"{prefix}_MAX_ENTRIES", max_entries),
+            policy=os.environ.get(f"{prefix}_POLICY", policy).lower(),
+            **kwargs,
+        )
+
+    def get(self, key: CacheKey, default: Any = None) -> Any:
+        """读取缓存并更新命中统计"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            entry[2] += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def peek(self, key: CacheKey, default: Any = None) -> Any:
+        """读取缓存但不影响统计和淘汰顺序"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return default if entry is None else entry[0]
+
+    def put(self, key: CacheKey, value: Any) -> bool:
+        """写入缓存，同时清理同一文件的旧版本条目
+
+        Returns:
+            bool: 是否成功写入（超出预算的单个条目不会被缓存）
+        """
+        if self.max_bytes <= 0:
+            return False
+        size = self.sizeof(value)
+        with self._lock:
+            self._purge_stale(key[0], key[1])
+            if size > self.max_bytes:
+                self.rejections += 1
+                logger.warning(
+                    f"[{self.name}] 条目大小 {size} 字节超过缓存预算 {self.max_bytes}，不缓存"
+                )
+                return False
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = [value, size, 1]
+            self.current_bytes += size
+            self._evict()
+            return True
+
+    def _evict(self) -> None:
+        while self._entries and (
+            self.current_bytes > self.max_bytes
+            or (self.max_entries and len(self._entries) > self.max_entries)
+        ):
+            if self.policy == "lfu":
+                # 频率最低者优先，频率相同时淘汰最久未使用的
+                victim = min(self._entries, key=lambda k: self._entries[k][2])
+            else:
+                victim = next(iter(self._entries))
+            _, size, _ = self._entries.pop(victim)
+            self.current_bytes -= size
+            self.evictions += 1
+            logger.debug(f"[{self.name}] 淘汰缓存 {victim[:2]}")
+
+    def _purge_stale(self, filepath: Hashable, mtime: Any) -> int:
+        stale = [k for k in self._entries if k[0] == filepath and k[1] != mtime]
+        for k in stale:
+            self.current_bytes -= self._entries.pop(k)[1]
+        return len(stale)
+
+    def purge_stale(self, filepath: Hashable, mtime: Any) -> int:
+        """清理指定文件中修改时间不等于 mtime 的条目"""
+        with self._lock:
+            return self._purge_stale(filepath, mtime)
+
+    def invalidate(self, filepath: Optional[Hashable] = None) -> int:
+        """清理指定文件的所有条目，filepath 为 None 时清空缓存"""
+        with self._lock:
+            if filepath is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self.current_bytes = 0
+                return count
+            keys = [k for k in self._entries if k[0] == filepath]
+            for k in keys:
+                self.current_bytes -= self._entries.pop(k)[1]
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "rejections": self.rejections,
+            }
+
+    def __contains__(self, key: CacheKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def invalidate_file(filepath: str) -> int:
+    """文件被写入后，清理所有缓存中与该文件相关的条目"""
+    return sum(c.invalidate(filepath) for c in _registry.values())
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """返回所有已注册缓存的统计信息"""
+    return {name: c.stats() for name, c in _registry.items()}
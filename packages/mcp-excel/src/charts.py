@@ -0,0 +1,333 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger("excel-mcp")
+
+# 中文字体候选，按顺序使用已安装的第一个 sudo apt install fonts-wqy-zenhei
+FONT_FAMILIES = [
+    "PingFang SC",
+    "WenQuanYi Zen Hei",
+    "Microsoft YaHei",
+    "Arial Unicode MS",
+]
+
+# 图表输出格式，按保存路径的扩展名选择
+CHART_FORMATS = {
+    ".png": "png",
+    ".svg": "svg",
+    ".webp": "webp",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".pdf": "pdf",
+}
+
+# pyecharts 图表输出格式：完整 HTML 页面，或只包含图表选项的紧凑 JSON（可 gzip 压缩），
+# JSON 由前端 EchartsDisplayer 直接渲染
+ECHARTS_FORMATS = {
+    ".html": "html",
+    ".json": "json",
+    ".json.gz": "json.gz",
+}
+
+# 默认和最大 DPI，以及位图的最大像素数，超过时自动降低 DPI
+CHART_DPI = int(os.environ.get("EXCEL_CHART_DPI", "100"))
+CHART_MAX_DPI = int(os.environ.get("EXCEL_CHART_MAX_DPI", "300"))
+CHART_MAX_PIXELS = int(os.environ.get("EXCEL_CHART_MAX_MEGAPIXELS", "40")) * 1000000
+
+_configure_lock = threading.Lock()
+_configured = False
+# pyplot 的图形注册表无法改为线程独立时，退回到全局锁串行绘图
+_thread_local_figures = False
+_pyplot_lock = threading.Lock()
+
+
+class _ThreadFigures:
+    """按线程隔离的图形注册表，替换 pyplot 进程全局的 Gcf.figs
+
+    每个线程有独立的 OrderedDict，plt.figure()、plt.gca() 以及 pandas 的
+    df.plot() 都只会看到当前线程创建的图形，并发请求之间互不干扰
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def _figs(self) -> OrderedDict:
+        figs = getattr(self._local, "figs", None)
+        if figs is None:
+            figs = self._local.figs = OrderedDict()
+        return figs
+
+    def __getattr__(self, name):
+        return getattr(self._figs, name)
+
+    def __len__(self):
+        return len(self._figs)
+
+    def __bool__(self):
+        return bool(self._figs)
+
+    def __contains__(self, key):
+        return key in self._figs
+
+    def __iter__(self):
+        return iter(self._figs)
+
+    def __reversed__(self):
+        return reversed(self._figs)
+
+    def __getitem__(self, key):
+        return self._figs[key]
+
+    def __setitem__(self, key, value):
+        self._figs[key] = value
+
+    def __delitem__(self, key):
+        del self._figs[key]
+
+
+def configure() -> None:
+    """配置 matplotlib：Agg 后端、中文字体，并预先加载字体管理器
+
+    只在第一次调用时执行，之后的绘图请求不再重复设置 rcParams 或扫描字体
+    """
+    global _configured, _thread_local_figures
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        import matplotlib
+
+        matplotlib.use("Agg")
+        from matplotlib import font_manager
+
+        # 只保留已安装的中文字体，避免每次绘图都对缺失字体发出查找警告
+        installed = {font.name for font in font_manager.fontManager.ttflist}
+        families = [name for name in FONT_FAMILIES if name in installed]
+        if not families:
+            logger.warning(f"未找到中文字体 {FONT_FAMILIES}，图表中的中文可能无法显示")
+        matplotlib.rcParams["font.sans-serif"] = families + [
+            name
+            for name in matplotlib.rcParams["font.sans-serif"]
+            if name not in families
+        ]
+        matplotlib.rcParams["axes.unicode_minus"] = False  # 解决负号显示问题
+        font_manager.findfont(
+            font_manager.FontProperties(family=matplotlib.rcParams["font.sans-serif"])
+        )
+
+        import matplotlib.pyplot  # noqa: F401
+        from matplotlib import _pylab_helpers
+
+        try:
+            if not isinstance(_pylab_helpers.Gcf.figs, OrderedDict):
+                raise TypeError(type(_pylab_helpers.Gcf.figs))
+            _pylab_helpers.Gcf.figs = _ThreadFigures()
+            _thread_local_figures = True
+        except Exception as e:
+            logger.warning(f"无法按线程隔离 pyplot 图形，绘图将串行执行: {e}")
+        _configured = True
+
+
+def warm_up() -> None:
+    """启动时调用，提前完成导入、字体加载和一次绘制"""
+    configure()
+    import io
+    import warnings
+
+    with pyplot_session() as plt, warnings.catch_warnings():
+        # 未安装中文字体时忽略缺字警告，configure 已经提示过
+        warnings.simplefilter("ignore")
+        plt.plot([0, 1], [0, 1])
+        plt.title("预热")
+        plt.savefig(io.BytesIO(), format="png")
+
+
+@contextmanager
+def pyplot_session() -> Iterator:
+    """提供当前请求专用的 pyplot，退出时关闭本请求创建的所有图形
+
+    pyplot 的图形注册表按线程隔离时，多个请求可以同时绘图；
+    否则使用全局锁串行执行
+    """
+    configure()
+    import matplotlib.pyplot as plt
+
+    if _thread_local_figures:
+        plt.close("all")
+        try:
+            yield plt
+        finally:
+            plt.close("all")
+        return
+    with _pyplot_lock:
+        plt.close("all")
+        try:
+            yield plt
+        finally:
+            plt.close("all")
+
+
+def chart_format(save_path: str) -> str:
+    """根据保存路径的扩展名返回输出格式
+
+    Raises:
+        ValueError: 不支持的扩展名
+    """
+    ext = os.path.splitext(save_path)[1].lower()
+    if ext not in CHART_FORMATS:
+        raise ValueError(
+            f"不支持的图表格式 {ext or '(无扩展名)'}，可用格式: {sorted(CHART_FORMATS)}"
+        )
+    return CHART_FORMATS[ext]
+
+
+def echarts_format(save_path: str) -> str:
+    """根据保存路径的扩展名返回 pyecharts 图表的输出格式
+
+    Raises:
+        ValueError: 不支持的扩展名
+    """
+    lower = save_path.lower()
+    for ext in sorted(ECHARTS_FORMATS, key=len, reverse=True):
+        if lower.endswith(ext):
+            return ECHARTS_FORMATS[ext]
+    raise ValueError(
+        f"不支持的 pyecharts 图表格式 {save_path}，可用格式: {sorted(ECHARTS_FORMATS)}"
+    )
+
+
+def dump_echarts_options(chart) -> str:
+    """输出紧凑的图表选项 JSON
+
+    与 chart.dump_options_with_quotes() 结果相同（JsCode 保留为字符串），
+    但不缩进、不换行，数据量大的图表体积约为缩进输出的三分之一
+    """
+    import simplejson
+    from pyecharts.charts.base import default
+    from pyecharts.commons import utils
+
+    return utils.replace_placeholder_with_quotes(
+        simplejson.dumps(
+            chart.get_options(),
+            separators=(",", ":"),
+            default=default,
+            ignore_nan=True,
+        )
+    )
+
+
+def save_echarts(chart, save_path: str) -> None:
+    """按扩展名保存 pyecharts 图表：.html 为完整页面，.json / .json.gz 只保存图表选项"""
+    fmt = echarts_format(save_path)
+    if fmt == "html":
+        chart.render(save_path)
+        return
+    if not hasattr(chart, "get_options"):
+        raise TypeError(f"{type(chart).__name__} 只能保存为 HTML")
+    data = dump_echarts_options(chart).encode("utf-8")
+    if fmt == "json.gz":
+        import gzip
+
+        # mtime=0 使相同图表的压缩结果一致
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+    with open(save_path, "wb") as f:
+        f.write(data)
+
+
+def limit_dpi(figure, dpi: Optional[int] = None) -> int:
+    """限制 DPI 不超过 CHART_MAX_DPI，且位图像素数不超过 CHART_MAX_PIXELS"""
+    dpi = min(int(dpi or CHART_DPI), CHART_MAX_DPI)
+    width, height = figure.get_size_inches()
+    if width * height * dpi * dpi > CHART_MAX_PIXELS:
+        dpi = int((CHART_MAX_PIXELS / (width * height)) ** 0.5)
+    return max(dpi, 1)
+
+
+def save_figure(figure, save_path: str, dpi: Optional[int] = None) -> None:
+    """按扩展名对应的格式保存图形"""
+    fmt = chart_format(save_path)
+    figure.savefig(save_path, format=fmt, dpi=limit_dpi(figure, dpi))
+
+
+def _render_job(index: int, directory: str, fmt: str) -> None:
+    import numpy as np
+
+    with pyplot_session() as plt:
+        rng = np.random.default_rng(index)
+        fig, axes = plt.subplots(1, 2, figsize=(8, 4))
+        axes[0].plot(rng.random(2000).cumsum())
+        axes[1].bar(range(30), rng.random(30))
+        plt.title(f"chart {index}")
+        save_figure(plt.gcf(), os.path.join(directory, f"chart-{index}.{fmt}"))
+
+
+def _benchmark_echarts(directory: str, points: int = 200000) -> None:
+    """比较 pyecharts 图表保存为 HTML、JSON 和 gzip JSON 的耗时与大小"""
+    import time
+    import numpy as np
+    from pyecharts.charts import Line
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    chart = (
+        Line()
+        .add_xaxis([str(i) for i in range(points)])
+        .add_yaxis("数值", rng.standard_normal(points).cumsum().round(3).tolist())
+    )
+    for ext in ECHARTS_FORMATS:
+        save_path = os.path.join(directory, f"echarts{ext}")
+        start = time.perf_counter()
+        save_echarts(chart, save_path)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(save_path) / 1024 / 1024
+        print(f"{ext}: {elapsed:.2f}s，{size:.2f} MB")
+
+
+def _benchmark(
+    directory: str, charts: int = 64, workers=(1, 2, 4, 8), fmt: str = "png"
+) -> None:
+    """比较不同并发数下的绘图吞吐量，以及全局锁串行绘图的吞吐量"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    warm_up()
+    print(f"预热（导入、字体加载、首次绘制）: {time.perf_counter() - start:.2f}s")
+    print(f"按线程隔离图形: {_thread_local_figures}，CPU 核数: {os.cpu_count()}")
+
+    def serialized(index: int, directory: str, fmt: str) -> None:
+        with _pyplot_lock:
+            _render_job(index, directory, fmt)
+
+    for count in workers:
+        for name, job in (("独立图形", _render_job), ("全局锁", serialized)):
+            if name == "全局锁" and count == 1:
+                continue
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=count) as pool:
+                for future in [
+                    pool.submit(job, i, directory, fmt) for i in range(charts)
+                ]:
+                    future.result()
+            elapsed = time.perf_counter() - start
+            print(f"{count} 个并发 {name}: {charts / elapsed:.1f} 张/秒")
+
+
+# 绘图吞吐量基准: python -m src.charts <输出目录> [png|svg|webp]
+# pyecharts 输出格式基准: python -m src.charts <输出目录> echarts
+if __name__ == "__main__":
+    import sys
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "./benchmark-output"
+    fmt = sys.argv[2] if len(sys.argv) > 2 else "png"
+    if fmt == "echarts":
+        _benchmark_echarts(directory)
+    else:
+        _benchmark(directory, fmt=fmt)
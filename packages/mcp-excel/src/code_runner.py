@@ -1,4 +1,61 @@
 import ast
+import sys
+import marshal
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from .cache import MemoryCache
+
+# 转换并编译后的用户代码缓存，键为 (代码内容的 sha256, 0)，代码缓存没有文件版本
+code_cache = MemoryCache.from_env(
+    "code",
+    prefix="EXCEL_CODE_CACHE",
+    max_mb=16,
+    max_entries=256,
+    sizeof=lambda code: len(marshal.dumps(code)),
+)
+
+
+class _ThreadLocalStdout:
+    """按线程分发的标准输出，工具在线程池中并发执行时各自捕获自己的 print 输出"""
+
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, "buffer", None) or self._default
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._default, name)
+
+
+_stdout_lock = threading.Lock()
+
+
+@contextmanager
+def capture_stdout(buffer):
+    """将当前线程的标准输出重定向到 buffer，不影响其他线程
+
+    与 contextlib.redirect_stdout 不同，后者替换的是进程全局的 sys.stdout
+    """
+    with _stdout_lock:
+        if not isinstance(sys.stdout, _ThreadLocalStdout):
+            sys.stdout = _ThreadLocalStdout(sys.stdout)
+        proxy = sys.stdout
+    previous = getattr(proxy._local, "buffer", None)
+    proxy._local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        proxy._local.buffer = previous
 
 
 def transform_top_level_imports(code_string):
@@ -53,10 +110,42 @@ def transform_top_level_imports(code_string):
     return "\n".join(result)
 
 
+def compile_python_code(python_code):
+    """转换并编译用户代码，相同内容的代码（例如重试）直接复用缓存的代码对象"""
+    key = (hashlib.sha256(python_code.encode("utf-8")).hexdigest(), 0)
+    code = code_cache.get(key)
+    if code is None:
+        result_code = transform_top_level_imports(python_code)
+        code = compile(result_code, "<string>", "exec")
+        code_cache.put(key, code)
+    return code
+
+
 def run_python_code(python_code, exec_globals, exec_locals):
-    result_code = transform_top_level_imports(python_code)
-    # print(result_code)
-    return exec(result_code, exec_globals, exec_locals)
+    return exec(compile_python_code(python_code), exec_globals, exec_locals)
+
+
+def _benchmark(snippets, rounds=2000):
+    """对比每次转换再 exec 源码与使用编译缓存的耗时"""
+    import time
+
+    def uncached(code):
+        exec(transform_top_level_imports(code), {}, {})
+
+    def cached(code):
+        exec(compile_python_code(code), {}, {})
+
+    code_cache.invalidate()
+    results = {}
+    for name, run in (("uncached", uncached), ("cached", cached)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for code in snippets:
+                run(code)
+        elapsed = time.perf_counter() - start
+        results[name] = round(elapsed / (rounds * len(snippets)) * 1e6, 1)
+    print(f"每段代码平均耗时(微秒): {results}")
+    print(f"缓存统计: {code_cache.stats()}")
 
 
 # 写个测试
@@ -78,3 +167,29 @@ main(__import__('pandas').DataFrame({'commentlist': [None, '[]', '[]'], 'price':
     exec_locals = {}
     result = run_python_code(python_code, exec_globals, exec_locals)
     print(result)
+
+    # 编译缓存的微基准: python -m src.code_runner
+    _benchmark(
+        [
+            python_code,
+            """import pandas as pd
+import numpy as np
+def main(df):
+    df['日期'] = pd.to_datetime(df['日期'], errors='coerce')
+    monthly = df.groupby(df['日期'].dt.to_period('M'))['销量'].agg(['sum', 'mean'])
+    monthly['环比'] = monthly['sum'].pct_change()
+    print(monthly.tail())
+    return monthly
+""",
+            """import pandas as pd
+def main(df, plt):
+    top = df.groupby('城市')['销量'].sum().sort_values(ascending=False).head(10)
+    fig, ax = plt.subplots(figsize=(10, 6))
+    top.plot(kind='bar', ax=ax)
+    ax.set_title('销量前十城市')
+    ax.set_ylabel('销量')
+    plt.tight_layout()
+    return plt
+""",
+        ]
+    )
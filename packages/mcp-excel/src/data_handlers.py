@@ -1,50 +1,294 @@
 from typing import List, Dict, Union, Optional, Callable, Any, Tuple
 import os
 import logging
+import numpy as np
 import pandas as pd
 import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from abc import ABC, abstractmethod
-from .code_runner import run_python_code
+from .code_runner import capture_stdout, run_python_code
+from .cache import MemoryCache
+from .sidecar import get_sidecar
+from .schema import ColumnSchema, probe_columns, read_sheet_names
+from .sketches import HyperLogLog, top_k_counts
+from .readers import Filters, project_frame, read_csv_frame
+from .sandbox import get_sandbox
+from .writers import write_sheets
+from .sampling import sample_rows
+from .charts import chart_format, echarts_format, pyplot_session, save_figure
+from .downsample import HELPERS, downsample_figure, render_chart
+from .groupby import format_page, group_stats, top_groups
+from .correlation import correlation_matrix, format_correlations, get_correlation_matrix
 
 logger = logging.getLogger("excel-mcp")
 
-cache = {}
+# 解析后的 DataFrame 缓存，预算通过 EXCEL_CACHE_MAX_MB / EXCEL_CACHE_MAX_ENTRIES / EXCEL_CACHE_POLICY 配置
+dataframe_cache = MemoryCache.from_env(
+    "dataframe", prefix="EXCEL_CACHE", max_mb=1024, max_entries=64
+)
+
+# 工作表名称和列类型等元数据缓存
+schema_cache = MemoryCache.from_env(
+    "schema", prefix="EXCEL_SCHEMA_CACHE", max_mb=16, max_entries=512
+)
+
+# 列画像缓存，每个 (文件, 修改时间, 工作表) 一份
+profile_cache = MemoryCache.from_env(
+    "profile", prefix="EXCEL_PROFILE_CACHE", max_mb=64, max_entries=256
+)
+
+# 列画像默认保留的高频值数量，以及精确计算唯一值数量的最大行数
+PROFILE_TOP_K = int(os.environ.get("EXCEL_PROFILE_TOP_K", "20"))
+PROFILE_EXACT_DISTINCT_ROWS = int(
+    os.environ.get("EXCEL_PROFILE_EXACT_DISTINCT_ROWS", "2000000")
+)
+
+# 计算列画像时并行处理的列数
+PROFILE_WORKERS = int(
+    os.environ.get("EXCEL_PROFILE_WORKERS", str(min(8, os.cpu_count() or 1)))
+)
+
+# batch_analyze 支持的操作及其参数
+BATCH_OPERATIONS = {
+    "columns": "列名和数据类型",
+    "missing": "缺失值统计",
+    "unique": "唯一值分布，参数 columns、max_unique",
+    "numeric_stats": "数值统计，参数 columns",
+    "group_stats": "分组统计，参数 group_by（列名或列名列表）、agg_columns、agg_functions、top_n、offset",
+    "sample": "随机采样，参数 sample_size（不超过20）、seed、stratify_by",
+    "correlations": "相关性，参数 method、min_correlation",
+}
+
+NUMERIC_STAT_NAMES = ["count", "mean", "std", "min", "25%", "50%", "75%", "max", "sum"]
+
+
+def _cache_key(filepath: str, mod_time: float, kwargs: Dict[str, Any]) -> tuple:
+    """创建缓存键，包含文件路径、最后修改时间和额外参数
+
+    CSV 文件会忽略 sheet_name，不计入缓存键，不同工具以任何工作表名称读取同一个 CSV
+    文件都共享同一份缓存
+    """
+    if filepath.lower().endswith(".csv"):
+        kwargs = {k: v for k, v in kwargs.items() if k != "sheet_name"}
+    return (filepath, mod_time, frozenset(kwargs.items()))
+
+
+def cached_frame(filepath: str, sheet_name: Optional[str]) -> Optional[pd.DataFrame]:
+    """返回已由 read_data 缓存的完整工作表，未缓存时返回 None，不会触发读取"""
+    try:
+        key = _cache_key(
+            filepath, os.path.getmtime(filepath), {"sheet_name": sheet_name}
+        )
+    except OSError:
+        return None
+    if key not in dataframe_cache:
+        return None
+    return dataframe_cache.get(key)
+
+
+def _freeze(value: Any) -> Any:
+    """把列表等不可哈希的参数转换为元组，用于缓存键"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
 
 
 def cache_method(func):
     """
     装饰器，为实例方法添加基于文件路径和参数的缓存
-    支持基于文件最后修改时间的缓存失效
+    支持基于文件最后修改时间的缓存失效，写入新版本时会清理同一文件的旧条目
+
+    被装饰的方法额外接受 readonly 参数：
+        readonly=True 返回与缓存共享数据的浅拷贝，不复制数据，供只读分析工具使用，
+            调用方可以替换整列，但不能原地修改（.loc 赋值、inplace=True 等）
+        readonly=False（默认）返回完整的深拷贝，供会修改数据的代码执行工具使用
+
+    不全局开启 pandas 的 mode.copy_on_write：它会改变同一进程中用户代码的语义，
+    例如链式赋值 df["a"][mask] = x 将不再生效
+
+    columns / filters 投影参数不属于完整数据的缓存键：完整数据已在缓存中时直接从中
+    投影，否则只读取投影部分并以带投影参数的键单独缓存
     """
 
     @functools.wraps(func)
-    def wrapper(self, filepath, *args, **kwargs):
+    def wrapper(
+        self,
+        filepath,
+        *args,
+        readonly: bool = False,
+        columns: Optional[List[str]] = None,
+        filters: Filters = None,
+        **kwargs,
+    ):
         # 获取文件的最后修改时间
         try:
             mod_time = os.path.getmtime(filepath)
         except OSError:
             # 如果文件不存在或无法获取修改时间，则不使用缓存
-            return func(self, filepath, *args, **kwargs)
-
-        # 创建缓存键，包含文件路径、最后修改时间和额外参数
-        key = (filepath, mod_time, frozenset(kwargs.items()))
+            return func(
+                self, filepath, *args, columns=columns, filters=filters, **kwargs
+            )
 
-        if key not in cache:
+        key = _cache_key(filepath, mod_time, kwargs)
+        if columns is not None or filters:
+            if key in dataframe_cache:
+                full = dataframe_cache.get(key)
+                if full is not None:
+                    projected = project_frame(full, columns, filters)
+                    return projected.copy(deep=not readonly)
+            key = key + (("columns", _freeze(columns)), ("filters", _freeze(filters)))
+            kwargs = dict(kwargs, columns=columns, filters=filters)
+
+        result = dataframe_cache.get(key)
+        if result is None:
             # 缓存未命中，执行原始方法并缓存结果
-            print(f"未命中缓存 {key}")
+            logger.info(f"未命中缓存 {key}")
             result = func(self, filepath, *args, **kwargs)
-            cache[key] = result
-        return cache[key].copy()
+            dataframe_cache.put(key, result)
+        if isinstance(result, dict):
+            # Excel 的 sheet_name=None 返回 {工作表名: DataFrame}
+            return {
+                name: frame.copy(deep=not readonly) for name, frame in result.items()
+            }
+        return result.copy(deep=not readonly)
 
     return wrapper
 
 
+def is_numeric_column(series: pd.Series) -> bool:
+    """判断是否为数值列（不含布尔列），兼容 numpy 和 Arrow 类型"""
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(
+        series
+    )
+
+
+def value_summary(values: pd.Series, top_k: int = PROFILE_TOP_K) -> Dict[str, Any]:
+    """统计非空列的唯一值数量和高频值，输出大小只与 top_k 有关
+
+    超过 PROFILE_EXACT_DISTINCT_ROWS 行的列用 HyperLogLog 估计唯一值数量，
+    高频值在随机样本上统计并按比例还原计数
+    """
+    if len(values) > PROFILE_EXACT_DISTINCT_ROWS:
+        sample = values.sample(n=PROFILE_EXACT_DISTINCT_ROWS, random_state=0)
+        top_values, top_counts, _ = top_k_counts(sample, top_k)
+        scale = len(values) / len(sample)
+        return {
+            "distinct": HyperLogLog().update(values).count(),
+            "distinct_exact": False,
+            "top_values": top_values,
+            "top_counts": [int(round(c * scale)) for c in top_counts],
+        }
+    top_values, top_counts, distinct = top_k_counts(values, top_k)
+    return {
+        "distinct": distinct,
+        "distinct_exact": True,
+        "top_values": top_values,
+        "top_counts": top_counts,
+    }
+
+
+def map_columns(
+    func: Callable[[pd.Series], Any], df: pd.DataFrame, columns: List[str]
+) -> Dict[str, Any]:
+    """对多列分别执行 func，列数较多时在线程池中并行处理
+
+    factorize、bincount 和数值计算在 numpy / pandas 内部会释放 GIL，
+    宽表的各列可以在多个核心上同时计算
+    """
+    workers = min(PROFILE_WORKERS, len(columns))
+    if workers <= 1:
+        return {col: func(df[col]) for col in columns}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(func, [df[col] for col in columns])
+        return dict(zip(columns, results))
+
+
+def profile_column(series: pd.Series, top_k: int = PROFILE_TOP_K) -> Dict[str, Any]:
+    """对单列做一次遍历，计算类型、缺失值、唯一值、高频值和数值统计
+
+    Args:
+        series: 要分析的列
+        top_k: 保留的高频值数量
+
+    Returns:
+        Dict[str, Any]: 列画像
+    """
+    rows = len(series)
+    values = series.dropna()
+    profile: Dict[str, Any] = {
+        "dtype": str(series.dtype),
+        "count": len(values),
+        "null_count": rows - len(values),
+        "numeric": is_numeric_column(series),
+    }
+
+    profile.update(value_summary(values, top_k))
+
+    if profile["numeric"]:
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        if len(array):
+            q25, q50, q75 = np.quantile(array, [0.25, 0.5, 0.75])
+            profile.update(
+                {
+                    "mean": float(array.mean()),
+                    "std": float(array.std(ddof=1)) if len(array) > 1 else np.nan,
+                    "min": float(array.min()),
+                    "25%": float(q25),
+                    "50%": float(q50),
+                    "75%": float(q75),
+                    "max": float(array.max()),
+                    "sum": float(array.sum()),
+                }
+            )
+        else:
+            profile.update({name: np.nan for name in NUMERIC_STAT_NAMES[1:-1]})
+            profile["sum"] = 0.0
+    elif pd.api.types.is_datetime64_any_dtype(series) and len(values):
+        profile["min"] = values.min()
+        profile["max"] = values.max()
+    return profile
+
+
+def profile_dataframe(df: pd.DataFrame, top_k: int = PROFILE_TOP_K) -> Dict[str, Any]:
+    """计算整张表的列画像，供概览、缺失值、唯一值和数值统计工具共享"""
+    return {
+        "rows": len(df),
+        "top_k": top_k,
+        "columns": map_columns(
+            functools.partial(profile_column, top_k=top_k), df, list(df.columns)
+        ),
+    }
+
+
+def unique_values_profile(
+    df: pd.DataFrame, columns: Optional[List[str]] = None, top_k: int = PROFILE_TOP_K
+) -> Dict[str, Any]:
+    """只统计唯一值和高频值的轻量画像，结构与 profile_dataframe 相同，可直接用于 format_unique_values"""
+    columns = [col for col in (columns or df.columns) if col in df.columns]
+    return {
+        "rows": len(df),
+        "top_k": top_k,
+        "columns": map_columns(
+            lambda series: value_summary(series.dropna(), top_k), df, columns
+        ),
+    }
+
+
+def _chart_result(captured_output: str, save_path: str, report: Optional[str]) -> str:
+    """绘图工具的返回信息，自动降采样时附上降采样说明"""
+    result = f"{captured_output}\n图表已保存到: {save_path}"
+    return f"{result}\n{report}" if report else result
+
+
 class ExcelDataHandler:
     """Excel和CSV数据处理类，提供完整的文件操作功能"""
 
     def __init__(self, files_path: str):
         self.files_path = files_path
+        self.sidecar = get_sidecar(files_path)
+        # 配置 EXCEL_CODE_SANDBOX=process 时用户代码在沙箱进程池中执行
+        self.sandbox = get_sandbox()
 
     def get_file_path(self, filename: str) -> str:
         """获取文件的完整路径
@@ -63,31 +307,47 @@ class ExcelDataHandler:
 
     @cache_method
     def read_data(
-        self, filepath: str, sheet_name: str = None, **kwargs
+        self,
+        filepath: str,
+        sheet_name: str = None,
+        columns: Optional[List[str]] = None,
+        filters: Filters = None,
+        **kwargs,
     ) -> pd.DataFrame:
         """读取Excel或CSV文件数据
 
         Args:
             filepath: 文件路径
             sheet_name: 工作表名称，对于CSV文件此参数将被忽略
+            columns: 只读取的列，None 表示读取所有列
+            filters: 过滤条件 [(列名, 运算符, 值), ...]，多个条件之间为 AND
+            readonly: 由 cache_method 处理，为 True 时返回与缓存共享数据的浅拷贝
             **kwargs: 额外的参数，会传递给pandas的读取函数
 
         Returns:
             pd.DataFrame: 读取的数据
         """
         if self._is_csv_file(filepath):
-            return pd.read_csv(filepath, **kwargs)
+            return read_csv_frame(filepath, columns=columns, filters=filters, **kwargs)
         else:
-            return pd.read_excel(
-                filepath,
-                sheet_name=sheet_name,
-                engine="calamine",
-                **kwargs,
-            )
+            # 优先使用磁盘列式缓存，避免重复解析大型工作簿，投影读取只转换需要的列
+            df = self.sidecar.load(filepath, sheet_name, kwargs, columns, filters)
+            if df is None:
+                # calamine 无论 usecols 如何都会解析整个工作表，因此首次读取时解析完整
+                # 工作表并写入磁盘缓存，之后的投影读取直接从 Arrow 文件中按列读取
+                df = pd.read_excel(
+                    filepath,
+                    sheet_name=sheet_name,
+                    engine="calamine",
+                    **kwargs,
+                )
+                self.sidecar.store(filepath, sheet_name, kwargs, df)
+                df = project_frame(df, columns, filters)
+            return df
 
     def write_data(
         self, df: pd.DataFrame, filepath: str, sheet_name: str = None, **kwargs
-    ) -> None:
+    ) -> List[str]:
         """写入数据到Excel或CSV文件
 
         Args:
@@ -95,45 +355,104 @@ class ExcelDataHandler:
             filepath: 文件路径
             sheet_name: 工作表名称，对于CSV文件此参数将被忽略
             **kwargs: 额外的参数，会传递给pandas的写入函数
+
+        Returns:
+            List[str]: 实际写入的文件路径
         """
-        if self._is_csv_file(filepath):
-            df.to_csv(filepath, index=False, **kwargs)
-        else:
-            if os.path.exists(filepath):
-                with pd.ExcelWriter(
-                    filepath, mode="a", engine="openpyxl", if_sheet_exists="replace"
-                ) as writer:
-                    df.to_excel(
-                        writer, sheet_name=sheet_name or "Sheet1", index=False, **kwargs
-                    )
-            else:
-                with pd.ExcelWriter(filepath, mode="w", engine="openpyxl") as writer:
-                    df.to_excel(
-                        writer, sheet_name=sheet_name or "Sheet1", index=False, **kwargs
-                    )
+        return write_sheets(filepath, {sheet_name or "Sheet1": df}, **kwargs)
 
     def get_sheet_names(self, filepath: str) -> List[str]:
-        """获取Excel文件中的所有工作表名称，对于CSV文件返回['Sheet1']"""
+        """获取Excel文件中的所有工作表名称，对于CSV文件返回['Sheet1']
+
+        只读取工作簿元数据，结果按 (文件路径, 修改时间) 缓存
+        """
         try:
             if self._is_csv_file(filepath):
                 return ["Sheet1"]
             full_path = self.get_file_path(filepath)
-            excel_file = pd.ExcelFile(full_path)
-            return excel_file.sheet_names
+            key = (full_path, os.path.getmtime(full_path), "sheet_names")
+            sheet_names = schema_cache.get(key)
+            if sheet_names is None:
+                sheet_names = read_sheet_names(full_path)
+                schema_cache.put(key, sheet_names)
+            return list(sheet_names)
         except Exception as e:
             logger.error(f"Error getting sheet names: {e}")
             raise
 
+    def get_column_types(
+        self, filepath: str, sheet_name: str = None
+    ) -> Tuple[ColumnSchema, bool]:
+        """获取列名和数据类型，不读取完整工作表
+
+        如果完整数据已在内存缓存中，直接使用其精确类型；否则根据表头和有限的样本行推断，
+        结果按 (文件路径, 修改时间, 工作表) 缓存
+
+        Returns:
+            Tuple[ColumnSchema, bool]: [(列名, 类型名称)] 列表，以及类型是否来自样本推断
+        """
+        full_path = self.get_file_path(filepath)
+        mod_time = os.path.getmtime(full_path)
+        df = dataframe_cache.peek(
+            _cache_key(full_path, mod_time, {"sheet_name": sheet_name})
+        )
+        if df is not None:
+            return [(col, str(dtype)) for col, dtype in df.dtypes.items()], False
+
+        key = (full_path, mod_time, "columns", sheet_name)
+        schema = schema_cache.get(key)
+        if schema is None:
+            schema = probe_columns(full_path, sheet_name, self._is_csv_file(full_path))
+            schema_cache.put(key, schema)
+        return schema, True
+
     def get_columns(self, filepath: str, sheet_name: str = None) -> List[str]:
         """获取指定工作表的列名，对于CSV文件sheet_name参数将被忽略"""
         try:
             full_path = self.get_file_path(filepath)
-            df = self.read_data(full_path, sheet_name=sheet_name)
+            df = self.read_data(full_path, sheet_name=sheet_name, readonly=True)
             return df.columns.tolist()
         except Exception as e:
             logger.error(f"Error getting columns: {e}")
             raise
 
+    def run_in_sandbox(
+        self,
+        mode: str,
+        full_path: str,
+        python_code: str,
+        save_path: str = None,
+        sheet_name: str = None,
+        dpi: Optional[int] = None,
+        max_points: Optional[int] = None,
+        **kwargs,
+    ) -> Tuple[str, Any]:
+        """在沙箱进程池中执行用户代码
+
+        Excel 工作表已有磁盘列式缓存时只传递缓存文件路径，由沙箱进程内存映射读取，
+        否则从内存缓存取出数据交给沙箱序列化传递
+        """
+        if not self._is_csv_file(full_path) and self.sidecar.enabled:
+            arrow_file = self.sidecar.path_for(full_path, sheet_name, kwargs)
+            if os.path.exists(arrow_file):
+                return self.sandbox.run(
+                    mode,
+                    python_code,
+                    arrow_file=arrow_file,
+                    save_path=save_path,
+                    dpi=dpi,
+                    max_points=max_points,
+                )
+        df = self.read_data(full_path, sheet_name=sheet_name, readonly=True, **kwargs)
+        return self.sandbox.run(
+            mode,
+            python_code,
+            df=df,
+            save_path=save_path,
+            dpi=dpi,
+            max_points=max_points,
+        )
+
     def run_code(
         self,
         filepath: str,
@@ -145,33 +464,34 @@ class ExcelDataHandler:
     ) -> str:
         try:
             full_path = self.get_file_path(filepath)
-            df = self.read_data(full_path, sheet_name=sheet_name)
-            # 准备执行环境
-            exec_globals = {"pd": pd}
-            exec_locals = {"df": df}
+            if self.sandbox is not None:
+                _, result_df = self.run_in_sandbox(
+                    "transform", full_path, python_code, sheet_name=sheet_name
+                )
+            else:
+                df = self.read_data(full_path, sheet_name=sheet_name)
+                # 准备执行环境
+                exec_globals = {"pd": pd}
+                exec_locals = {"df": df}
 
-            # 执行Python代码
-            run_python_code(python_code, exec_globals, exec_locals)
-            if "main" not in exec_locals:
-                raise ValueError("代码中必须定义main函数")
-            # 执行main函数并获取结果
-            result_df = exec_locals["main"](df)
+                # 执行Python代码
+                run_python_code(python_code, exec_globals, exec_locals)
+                if "main" not in exec_locals:
+                    raise ValueError("代码中必须定义main函数")
+                # 执行main函数并获取结果
+                result_df = exec_locals["main"](df)
             # result_df 是 Dict[str,DataFrame] 或者 DataFrame
 
             if isinstance(result_df, dict):
                 if not all(isinstance(df, pd.DataFrame) for df in result_df.values()):
                     raise TypeError("当返回字典时，所有值必须是DataFrame类型")
-                # 批量写入多个工作表
-                for sheet_name, df in result_df.items():
-                    self.write_data(
-                        df,
-                        self.get_file_path(result_file_path),
-                        sheet_name=sheet_name,
-                        **kwargs,
-                    )
+                # 一次性写入多个工作表，工作簿只打开和保存一次
+                written = write_sheets(
+                    self.get_file_path(result_file_path), result_df, **kwargs
+                )
             elif isinstance(result_df, pd.DataFrame):
                 # 保持原有的单表写入逻辑
-                self.write_data(
+                written = self.write_data(
                     result_df,
                     self.get_file_path(result_file_path),
                     sheet_name=result_sheet_name or sheet_name,
@@ -179,7 +499,12 @@ class ExcelDataHandler:
                 )
             else:
                 raise TypeError("main函数必须返回DataFrame或Dict[str,DataFrame]类型")
-            return "执行完成 " + result_file_path
+            # CSV/Parquet/Feather 的多个工作表分别写入 {文件名}-{工作表}{扩展名}，
+            # 返回实际写入的文件，路径形式与 result_file_path 相同
+            directory = os.path.dirname(result_file_path)
+            return "执行完成 " + ", ".join(
+                os.path.join(directory, os.path.basename(target)) for target in written
+            )
         except Exception as e:
             logger.error(f"Error running code: {e}")
             return f"Error: {str(e)}"
@@ -194,11 +519,14 @@ class ExcelDataHandler:
             执行结果信息
         """
         import io
-        import sys
-        from contextlib import redirect_stdout
 
         try:
             full_path = self.get_file_path(filepath)
+            if self.sandbox is not None:
+                captured_output, result = self.run_in_sandbox(
+                    "log", full_path, python_code, **kwargs
+                )
+                return f"{captured_output}\n{result}"
             df = self.read_data(full_path, **kwargs)
 
             # 创建字符串IO对象来捕获标准输出
@@ -208,7 +536,7 @@ class ExcelDataHandler:
             exec_locals = {"df": df}
 
             # 重定向标准输出并执行Python代码
-            with redirect_stdout(output_buffer):
+            with capture_stdout(output_buffer):
                 run_python_code(python_code, exec_globals, exec_locals)
 
                 if "main" not in exec_locals:
@@ -226,95 +554,132 @@ class ExcelDataHandler:
             return f"Error: {str(e)}"
 
     def run_code_with_plot(
-        self, filepath: str, python_code: str, save_path: str, **kwargs
+        self,
+        filepath: str,
+        python_code: str,
+        save_path: str,
+        dpi: Optional[int] = None,
+        max_points: Optional[int] = None,
+        **kwargs,
     ) -> str:
         """执行带有matplotlib绘图功能的Python代码
         Args:
             filepath: 输入文件路径
             python_code: 要执行的Python代码
-            save_path: 图表保存路径，如果不提供则返回base64编码的图片
+            save_path: 图表保存路径，扩展名决定输出格式，见 charts.CHART_FORMATS
+            dpi: 位图分辨率，不超过 EXCEL_CHART_MAX_DPI
+            max_points: 折线超过该点数时自动降采样，默认 EXCEL_CHART_MAX_POINTS，0 表示不降采样
             **kwargs: 额外的参数
         Returns:
             执行结果信息和图表数据
         """
         import io
-        from contextlib import redirect_stdout
-        import matplotlib.pyplot as plt
-        import matplotlib as mpl
-
-        # 设置中文字体 sudo apt install fonts-wqy-zenhei
-        mpl.rcParams["font.sans-serif"] = [
-            "PingFang SC",
-            "WenQuanYi Zen Hei",
-            "Microsoft YaHei",
-            "Arial Unicode MS",
-        ]
-        mpl.rcParams["axes.unicode_minus"] = False  # 解决负号显示问题
 
         try:
-            full_path = self.get_file_path(filepath)
-            df = self.read_data(full_path, **kwargs)
+            chart_format(save_path)
+        except ValueError as e:
+            return f"Error: {str(e)}"
 
-            # 创建字符串IO对象来捕获标准输出
-            output_buffer = io.StringIO()
-            exec_globals = {"pd": pd, "plt": plt}
-            exec_locals = {"df": df}
+        if self.sandbox is not None:
+            try:
+                save_full_path = self.get_file_path(save_path)
+                os.makedirs(os.path.dirname(save_full_path), exist_ok=True)
+                captured_output, report = self.run_in_sandbox(
+                    "plot",
+                    self.get_file_path(filepath),
+                    python_code,
+                    save_path=save_full_path,
+                    dpi=dpi,
+                    max_points=max_points,
+                    **kwargs,
+                )
+                return _chart_result(captured_output, save_path, report)
+            except Exception as e:
+                logger.error(f"Error running code with plot: {e}")
+                return f"Error: {str(e)}"
 
-            # 重定向标准输出并执行Python代码
-            with redirect_stdout(output_buffer):
-                run_python_code(python_code, exec_globals, exec_locals)
+        # 每个请求使用独立的图形，多个绘图请求可以在线程池中同时执行
+        with pyplot_session() as plt:
+            try:
+                full_path = self.get_file_path(filepath)
+                df = self.read_data(full_path, **kwargs)
 
-                if "main" not in exec_locals:
-                    raise ValueError("代码中必须定义main函数")
+                # 创建字符串IO对象来捕获标准输出
+                output_buffer = io.StringIO()
+                exec_globals = {"pd": pd, "plt": plt, **HELPERS}
+                exec_locals = {"df": df}
 
-                # 执行main函数
-                exec_locals["main"](df, plt)
+                # 重定向标准输出并执行Python代码
+                with capture_stdout(output_buffer):
+                    run_python_code(python_code, exec_globals, exec_locals)
 
-            # 获取捕获的输出
-            captured_output = output_buffer.getvalue()
-            print(captured_output)
+                    if "main" not in exec_locals:
+                        raise ValueError("代码中必须定义main函数")
 
-            # 确保目标目录存在
-            save_full_path = self.get_file_path(save_path)
-            os.makedirs(os.path.dirname(save_full_path), exist_ok=True)
-            # 保存图表到文件
-            plt.savefig(save_full_path)
-            plt.close()
-            return f"{captured_output}\n图表已保存到: {save_path}"
+                    # 执行main函数
+                    exec_locals["main"](df, plt)
 
-        except Exception as e:
-            logger.error(f"Error running code with plot: {e}")
-            return f"Error: {str(e)}"
-        finally:
-            plt.close("all")
+                # 获取捕获的输出
+                captured_output = output_buffer.getvalue()
+                print(captured_output)
+
+                # 确保目标目录存在
+                save_full_path = self.get_file_path(save_path)
+                os.makedirs(os.path.dirname(save_full_path), exist_ok=True)
+                # 保存图表到文件，点数过多的折线先降采样
+                report = downsample_figure(plt.gcf(), max_points)
+                save_figure(plt.gcf(), save_full_path, dpi)
+                return _chart_result(captured_output, save_path, report)
+
+            except Exception as e:
+                logger.error(f"Error running code with plot: {e}")
+                return f"Error: {str(e)}"
 
     def run_code_with_pyecharts(
-        self, filepath: str, python_code: str, save_path: str, **kwargs
+        self,
+        filepath: str,
+        python_code: str,
+        save_path: str,
+        max_points: Optional[int] = None,
+        **kwargs,
     ) -> str:
         """执行带有pyecharts绘图功能的Python代码
         Args:
             filepath: 输入文件路径
             python_code: 要执行的Python代码
-            save_path: 图表保存路径，必须以.html结尾
+            save_path: 图表保存路径，.html 为完整页面，.json / .json.gz 只保存图表选项
+            max_points: 系列超过该点数时自动降采样，默认 EXCEL_CHART_MAX_POINTS，0 表示不降采样
             **kwargs: 额外的参数
         Returns:
             执行结果信息和图表数据
         """
         import io
-        from contextlib import redirect_stdout
 
         try:
+            echarts_format(save_path)
             full_path = self.get_file_path(filepath)
+            if self.sandbox is not None:
+                save_full_path = self.get_file_path(save_path)
+                os.makedirs(os.path.dirname(save_full_path), exist_ok=True)
+                captured_output, report = self.run_in_sandbox(
+                    "pyecharts",
+                    full_path,
+                    python_code,
+                    save_path=save_full_path,
+                    max_points=max_points,
+                    **kwargs,
+                )
+                return _chart_result(captured_output, save_path, report)
             df = self.read_data(full_path, **kwargs)
 
             # 创建字符串IO对象来捕获标准输出
             output_buffer = io.StringIO()
 
-            exec_globals = {"pd": pd}
+            exec_globals = {"pd": pd, **HELPERS}
             exec_locals = {"df": df}
 
             # 重定向标准输出并执行Python代码
-            with redirect_stdout(output_buffer):
+            with capture_stdout(output_buffer):
                 run_python_code(python_code, exec_globals, exec_locals)
 
                 if "main" not in exec_locals:
@@ -327,12 +692,12 @@ class ExcelDataHandler:
                 save_full_path = self.get_file_path(save_path)
                 os.makedirs(os.path.dirname(save_full_path), exist_ok=True)
 
-                # 保存HTML文件
-                chart.render(save_full_path)
+                # 保存HTML或选项JSON文件，点数过多的系列先降采样
+                report = render_chart(chart, save_full_path, max_points)
 
             # 获取捕获的输出
             captured_output = output_buffer.getvalue()
-            return f"{captured_output}\n图表已保存到: {save_path}"
+            return _chart_result(captured_output, save_path, report)
 
         except Exception as e:
             logger.error(f"Error running code with pyecharts: {e}")
@@ -352,29 +717,26 @@ class ExcelDataHandler:
             str: 包含列间相关性分析的详细结果字符串
         """
         try:
-            # 获取数值类型的列
-            numeric_cols = df.select_dtypes(include=["int64", "float64"]).columns
-            if len(numeric_cols) < 2:
-                return "没有足够的数值列来计算相关性"
-
-            # 计算相关性矩阵
-            correlation_matrix = df[numeric_cols].corr(method=method)
-
-            # 筛选显著相关的结果
-            significant_correlations = []
-            for i in range(len(numeric_cols)):
-                for j in range(i + 1, len(numeric_cols)):
-                    corr = correlation_matrix.iloc[i, j]
-                    if abs(corr) >= min_correlation:
-                        significant_correlations.append(
-                            f"{numeric_cols[i]} 和 {numeric_cols[j]} 的相关系数为: {corr:.4f}"
-                        )
-
-            if not significant_correlations:
-                return f"没有找到相关系数绝对值大于{min_correlation}的列对"
-
-            return "\n".join(significant_correlations)
+            matrix, sample_rows = correlation_matrix(df, method)
+            return format_correlations(matrix, min_correlation, sample_rows)
+        except Exception as e:
+            logger.error(f"计算相关性时出错: {e}")
+            raise
 
+    def get_correlations(
+        self,
+        filepath: str,
+        sheet_name: str = None,
+        method: str = "pearson",
+        min_correlation: float = 0.5,
+    ) -> str:
+        """计算工作表数值列之间的相关性，相关系数矩阵按文件版本和方法缓存，
+        不同的 min_correlation 查询不会重新计算"""
+        try:
+            matrix, sample_rows = get_correlation_matrix(
+                self, filepath, sheet_name, method
+            )
+            return format_correlations(matrix, min_correlation, sample_rows)
         except Exception as e:
             logger.error(f"计算相关性时出错: {e}")
             raise
@@ -393,7 +755,7 @@ class ExcelDataHandler:
         """
         try:
             full_path = self.get_file_path(filepath)
-            df = self.read_data(full_path, **kwargs)
+            df = self.read_data(full_path, readonly=True, **kwargs)
             result = []
             # 数据预览
             result.append("=== 数据预览 ===")
@@ -419,6 +781,287 @@ class ExcelDataHandler:
             logger.error(f"Error inspecting data: {e}")
             return f"Error: {str(e)}"
 
+    def get_backend(self, filepath: str):
+        """大文件且部署配置了 modin/dask 时返回分区后端，否则返回 None"""
+        from .backends import get_backend
+
+        return get_backend(self.get_file_path(filepath))
+
+    def get_chunked_analyzer(self, filepath: str):
+        """大型 CSV 文件返回分块分析器，其他文件返回 None
+
+        聚合类工具在返回值不为 None 时按块合并部分结果，避免整体载入文件
+        """
+        from .streaming import ChunkedCSVAnalyzer, should_stream
+
+        full_path = self.get_file_path(filepath)
+        if should_stream(full_path):
+            logger.info(f"文件较大，使用流式处理: {full_path}")
+            return ChunkedCSVAnalyzer(full_path)
+        return None
+
+    def get_profile(
+        self, filepath: str, sheet_name: str = None, top_k: int = PROFILE_TOP_K
+    ) -> Dict[str, Any]:
+        """获取工作表的列画像，按 (文件路径, 修改时间, 工作表) 缓存
+
+        Args:
+            filepath: 文件路径
+            sheet_name: 工作表名称，对于CSV文件此参数将被忽略
+            top_k: 每列至少保留的高频值数量，缓存中的画像不足时重新计算
+
+        Returns:
+            Dict[str, Any]: 包含行数和每列画像的字典
+        """
+        full_path = self.get_file_path(filepath)
+        key = (full_path, os.path.getmtime(full_path), sheet_name)
+        profile = profile_cache.get(key)
+        if profile is None or profile["top_k"] < top_k:
+            df = self.read_data(full_path, sheet_name=sheet_name, readonly=True)
+            profile = profile_dataframe(df, max(top_k, PROFILE_TOP_K))
+            profile_cache.put(key, profile)
+        return profile
+
+    def format_missing_values(self, profile: Dict[str, Any]) -> str:
+        """根据列画像生成缺失值统计表"""
+        rows = profile["rows"]
+        missing_count = pd.Series(
+            {col: info["null_count"] for col, info in profile["columns"].items()},
+            dtype="int64",
+        )
+        missing_percent = (missing_count / rows * 100).round(4)
+        missing_info = pd.DataFrame(
+            {"缺失值数量": missing_count, "缺失率(%)": missing_percent}
+        )
+        return missing_info.sort_values("缺失值数量", ascending=False).to_string()
+
+    def format_unique_values(
+        self,
+        profile: Dict[str, Any],
+        columns: Optional[List[str]] = None,
+        max_unique: int = 10,
+    ) -> str:
+        """根据列画像生成唯一值信息，values 按出现频率降序排列"""
+        result = {}
+        for col in columns or profile["columns"].keys():
+            info = profile["columns"].get(col)
+            if info is None:
+                continue
+            unique_count = info["distinct"]
+            result[col] = {
+                "count": unique_count,
+                "values": info["top_values"][:max_unique],
+                "message": (
+                    f"超过{max_unique}个唯一值，仅显示出现次数最多的{max_unique}个"
+                    if unique_count > max_unique
+                    else ""
+                ),
+            }
+            if not info["distinct_exact"]:
+                result[col]["message"] += "（唯一值数量为近似值）"
+        return str(result)
+
+    def format_numeric_stats(
+        self, profile: Dict[str, Any], columns: List[str]
+    ) -> pd.DataFrame:
+        """根据列画像生成与 describe() 加 sum 相同结构的统计表"""
+        return pd.DataFrame(
+            {
+                col: [
+                    float(profile["columns"][col][name]) for name in NUMERIC_STAT_NAMES
+                ]
+                for col in columns
+            },
+            index=NUMERIC_STAT_NAMES,
+        )
+
+    def format_column_types(self, schema: ColumnSchema, sampled: bool) -> str:
+        """生成列名和数据类型的对齐表格"""
+        # 计算列名最大长度用于对齐
+        max_col_len = max(len(str(col)) for col, _ in schema) if schema else 0
+        max_col_len = max(max_col_len, 10)  # 最小宽度为10
+
+        # 生成格式化的表格输出
+        header = f"共 {len(schema)} 列\n" + "-" * (max_col_len + 10) + "\n"
+        header += f"{'列名'.ljust(max_col_len)}    类型\n"
+        header += "-" * (max_col_len + 10) + "\n"
+
+        rows = [f"{str(col).ljust(max_col_len)}    {dtype}" for col, dtype in schema]
+        footer = "\n(类型根据样本行推断)" if sampled else ""
+        return header + "\n".join(rows) + footer
+
+    def compute_numeric_stats(
+        self, filepath: str, sheet_name: str = None, columns: List[str] = None
+    ) -> pd.DataFrame:
+        """计算数值列的 describe() 统计及总和
+
+        大文件依次尝试分区后端和分块分析器，否则优先使用列画像中的统计值
+        """
+        # 大文件优先交给部署配置的分区后端并行计算
+        backend = self.get_backend(filepath)
+        if backend is not None:
+            return backend.numeric_stats(self, filepath, sheet_name, columns)
+
+        analyzer = self.get_chunked_analyzer(filepath)
+        if analyzer is not None:
+            return analyzer.numeric_stats(columns)
+
+        profile = self.get_profile(filepath, sheet_name)
+        numerical_cols = (
+            [col for col, info in profile["columns"].items() if info["numeric"]]
+            if columns is None
+            else columns
+        )
+        if all(
+            profile["columns"].get(col, {}).get("numeric") for col in numerical_cols
+        ):
+            # 所有列都是数值列时，直接使用列画像中的统计值
+            return self.format_numeric_stats(profile, numerical_cols)
+
+        df = self.read_data(
+            self.get_file_path(filepath),
+            sheet_name=sheet_name,
+            columns=numerical_cols,
+            readonly=True,
+        )
+        # 获取基本统计信息
+        stats = df[numerical_cols].describe()
+
+        # 计算数值列的和
+        sums = df[numerical_cols].sum(numeric_only=True, skipna=True)
+        stats.loc["sum"] = sums
+        return stats
+
+    def compute_group_stats(
+        self,
+        filepath: str,
+        sheet_name: str,
+        group_by: Union[str, List[str]],
+        agg_columns: List[str],
+        agg_functions: List[str],
+    ) -> pd.DataFrame:
+        """按一列或多列分组聚合，返回未排序的结果，组按分组键排列
+
+        内存中的数据使用 groupby.group_stats，分组键编码按文件版本缓存，
+        同一分组键的后续聚合直接复用编码
+        """
+        backend = self.get_backend(filepath)
+        if backend is not None:
+            return backend.group_stats(
+                self, filepath, sheet_name, group_by, agg_columns, agg_functions
+            )
+        analyzer = self.get_chunked_analyzer(filepath)
+        if analyzer is not None:
+            return analyzer.group_stats(group_by, agg_columns, agg_functions)
+        return group_stats(
+            self, filepath, sheet_name, group_by, agg_columns, agg_functions
+        )
+
+    def format_group_stats(
+        self,
+        grouped: pd.DataFrame,
+        agg_columns: List[str],
+        agg_functions: List[str],
+        top_n: Optional[int] = 50,
+        offset: int = 0,
+    ) -> str:
+        """按第一个统计列的第一个聚合函数降序排序，只输出第 offset 起的 top_n 组"""
+        sort_col = (
+            (agg_columns[0], agg_functions[0])
+            if isinstance(grouped.columns, pd.MultiIndex)
+            else agg_columns[0]
+        )
+        page = top_groups(
+            grouped, sort_col, ascending=False, top_n=top_n, offset=offset
+        )
+        return format_page(page, len(grouped), offset, sort_col, ascending=False)
+
+    def run_batch(
+        self, filepath: str, sheet_name: str, operations: List[Dict[str, Any]]
+    ) -> List[Tuple[str, str]]:
+        """在同一个工作表上依次执行多个分析操作
+
+        工作表只读取一次，列画像在缺失值、唯一值和数值统计之间共享；
+        单个操作失败时记录错误信息，不影响其他操作
+
+        Args:
+            filepath: 文件路径
+            sheet_name: 工作表名称，对于CSV文件此参数将被忽略
+            operations: 操作列表，每项包含 op 字段和该操作的参数，见 BATCH_OPERATIONS
+
+        Returns:
+            List[Tuple[str, str]]: 每个操作的名称和结果文本
+        """
+        results = []
+        for spec in operations:
+            spec = dict(spec)
+            op = spec.pop("op", None)
+            try:
+                if op == "columns":
+                    output = self.format_column_types(
+                        *self.get_column_types(filepath, sheet_name)
+                    )
+                elif op == "missing":
+                    analyzer = self.get_chunked_analyzer(filepath)
+                    profile = (
+                        analyzer.missing_values()
+                        if analyzer is not None
+                        else self.get_profile(filepath, sheet_name)
+                    )
+                    output = self.format_missing_values(profile)
+                elif op == "unique":
+                    max_unique = int(spec.get("max_unique", 10))
+                    profile = self.get_profile(filepath, sheet_name, top_k=max_unique)
+                    output = self.format_unique_values(
+                        profile, spec.get("columns"), max_unique
+                    )
+                elif op == "numeric_stats":
+                    output = self.compute_numeric_stats(
+                        filepath, sheet_name, spec.get("columns")
+                    ).to_json(orient="records", force_ascii=False)
+                elif op == "group_stats":
+                    agg_functions = spec.get("agg_functions", ["mean", "count"])
+                    grouped = self.compute_group_stats(
+                        filepath,
+                        sheet_name,
+                        spec["group_by"],
+                        spec["agg_columns"],
+                        agg_functions,
+                    )
+                    output = self.format_group_stats(
+                        grouped,
+                        spec["agg_columns"],
+                        agg_functions,
+                        int(spec.get("top_n", 50)),
+                        int(spec.get("offset", 0)),
+                    )
+                elif op == "sample":
+                    output = self.get_random_sample(
+                        filepath,
+                        sheet_name,
+                        int(spec.get("sample_size", 5)),
+                        spec.get("seed"),
+                        spec.get("stratify_by"),
+                    ).to_json(orient="records", force_ascii=False)
+                elif op == "correlations":
+                    output = self.get_correlations(
+                        filepath,
+                        sheet_name,
+                        spec.get("method", "pearson"),
+                        float(spec.get("min_correlation", 0.5)),
+                    )
+                else:
+                    output = (
+                        f"Error: 不支持的操作 {op}，可用操作: {list(BATCH_OPERATIONS)}"
+                    )
+            except KeyError as e:
+                output = f"Error: 操作 {op} 缺少参数 {e}"
+            except Exception as e:
+                logger.error(f"批量分析操作 {op} 出错: {e}")
+                output = f"Error: {str(e)}"
+            results.append((op, output))
+        return results
+
     def get_missing_values_info(self, df: pd.DataFrame) -> str:
         """获取缺失值信息
 
@@ -453,44 +1096,25 @@ class ExcelDataHandler:
         Returns:
             包含唯一值信息的字典
         """
-        result = {}
-        cols_to_check = columns if columns else df.columns
-
-        for col in cols_to_check:
-            if col in df.columns:
-                unique_values = df[col].dropna().unique()
-                unique_count = len(unique_values)
-
-                values_list = (
-                    unique_values.tolist()
-                    if hasattr(unique_values, "tolist")
-                    else list(unique_values)
-                )
-                result[col] = {
-                    "count": unique_count,
-                    "values": (
-                        values_list[:max_unique]
-                        if unique_count > max_unique
-                        else values_list
-                    ),
-                    "message": (
-                        f"超过{max_unique}个唯一值，仅显示前{max_unique}个"
-                        if unique_count > max_unique
-                        else ""
-                    ),
-                }
-
-        return str(result)
+        profile = unique_values_profile(df, columns, top_k=max_unique)
+        return self.format_unique_values(profile, max_unique=max_unique)
 
     def get_random_sample(
-        self, df: pd.DataFrame, sample_size: int, **kwargs
+        self,
+        filepath: str,
+        sheet_name: str,
+        sample_size: int,
+        seed: Optional[int] = None,
+        stratify_by: Optional[str] = None,
     ) -> pd.DataFrame:
-        """获取数据的随机采样
+        """获取数据的随机采样，不为采样读取完整的工作表，见 sampling.sample_rows
 
         Args:
             filepath: 输入文件路径
+            sheet_name: 工作表名称，对于CSV文件此参数将被忽略
             sample_size: 需要采样的行数
-            **kwargs: 额外的参数，会传递给read_data方法
+            seed: 随机种子，None 表示每次随机
+            stratify_by: 分层列，各层按行数比例分配样本
 
         Returns:
             pd.DataFrame: 包含随机采样数据的DataFrame
@@ -499,15 +1123,11 @@ class ExcelDataHandler:
             ValueError: 采样数量大于数据集大小时抛出
         """
         try:
-
-            if sample_size > len(df):
-                raise ValueError(
-                    f"采样数量({sample_size})不能大于数据集大小({len(df)})"
-                )
-
             if sample_size > 20:
-                return ValueError(f"采样数量({sample_size})大于20，不支持随机采样")
-            return df.sample(n=sample_size, random_state=None)
+                raise ValueError(f"采样数量({sample_size})大于20，不支持随机采样")
+            return sample_rows(
+                self, filepath, sheet_name, sample_size, seed, stratify_by
+            )
         except Exception as e:
             logger.error(f"Error getting random sample: {e}")
             raise
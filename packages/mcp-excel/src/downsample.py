@@ -0,0 +1,450 @@
+import os
+import json
+import logging
+from typing import List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .charts import echarts_format, save_echarts
+
+logger = logging.getLogger("excel-mcp")
+
+# 单个图表系列超过该点数时自动降采样，0 表示不自动降采样
+CHART_MAX_POINTS = int(os.environ.get("EXCEL_CHART_MAX_POINTS", "10000"))
+# 自动降采样时每个系列保留的点数
+CHART_TARGET_POINTS = int(os.environ.get("EXCEL_CHART_TARGET_POINTS", "2000"))
+
+# 估计 HTML 中数据大小时抽取的数据点数量
+_SIZE_SAMPLE = 1000
+# pyecharts 以 indent=4 输出选项，系列数据项位于第 4 层嵌套
+_OPTIONS_DEPTH = 4
+
+
+class Reduction(NamedTuple):
+    """一个系列的降采样结果
+
+    Attributes:
+        name: 系列名称
+        method: 降采样方法：lttb 或 top_n
+        before: 原始点数
+        after: 降采样后的点数
+        saved_bytes: 图表数据序列化后估计减少的字节数，matplotlib 图表为 0
+    """
+
+    name: str
+    method: str
+    before: int
+    after: int
+    saved_bytes: int
+
+
+def _numeric_axis(values) -> np.ndarray:
+    """把 x 轴取值转换为浮点数，日期转为时间戳，其他类型使用位置"""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values.astype("int64").to_numpy(dtype=np.float64)
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(
+        values.dtype
+    ):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.arange(len(values), dtype=np.float64)
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的位置
+
+    首尾两点始终保留，中间的点分成 n_out - 2 个桶，每个桶保留与前一个保留点、
+    下一个桶均值组成的三角形面积最大的点，折线的峰谷和趋势得以保留。
+    x 需要按升序排列；x 或 y 缺失的点不参与计算，也不会被保留。
+
+    Args:
+        x: x 轴数值
+        y: y 轴数值
+        n_out: 保留的点数，至少为 3
+
+    Returns:
+        升序排列的位置数组
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    positions = np.flatnonzero(finite)
+    n_out = max(int(n_out), 3)
+    if len(positions) <= n_out:
+        return positions
+    x = x[positions]
+    y = y[positions]
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    # 每个桶的均值向量化预先计算，最后一个桶的“下一个桶”是终点
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[: n - 1], edges[:-1]) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[: n - 1], edges[:-1]) / counts, y[-1])
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return positions[selected]
+
+
+def downsample_lttb(
+    df: pd.DataFrame, x: str, y: Union[str, List[str]], n_out: int = 2000
+) -> pd.DataFrame:
+    """用 LTTB 对折线图数据降采样，返回保留的行
+
+    多个 y 列时每列各保留 n_out / 列数 个点，结果为所有列保留行的并集，
+    行数不超过 n_out。数据需要已按 x 排序。
+
+    Args:
+        df: 数据
+        x: x 轴列名，可以是数值、日期或其他类型（使用行的位置）
+        y: 一个或多个数值列名
+        n_out: 最多保留的行数
+    """
+    columns = [y] if isinstance(y, str) else list(y)
+    if len(df) <= n_out:
+        return df
+    axis = _numeric_axis(df[x])
+    budget = max(n_out // len(columns), 3)
+    keep = np.unique(
+        np.concatenate(
+            [
+                lttb_indices(
+                    axis, df[col].to_numpy(dtype=np.float64, na_value=np.nan), budget
+                )
+                for col in columns
+            ]
+        )
+    )
+    return df.iloc[keep]
+
+
+def histogram_bins(values: pd.Series, bins: int = 50) -> pd.DataFrame:
+    """把数值列分箱计数，用柱状图代替逐点绘制分布
+
+    Returns:
+        DataFrame，列为 label（区间文字）、left、right、count
+    """
+    data = pd.to_numeric(values, errors="coerce").dropna().to_numpy(dtype=np.float64)
+    counts, edges = np.histogram(data, bins=bins)
+    left, right = edges[:-1], edges[1:]
+    return pd.DataFrame(
+        {
+            "label": [f"{lo:.4g}~{hi:.4g}" for lo, hi in zip(left, right)],
+            "left": left,
+            "right": right,
+            "count": counts,
+        }
+    )
+
+
+def top_n_other(
+    df: pd.DataFrame,
+    category: str,
+    value: Optional[str] = None,
+    n: int = 20,
+    agg: str = "sum",
+    other_label: str = "其他",
+) -> pd.DataFrame:
+    """按类别汇总后保留前 n 个类别，其余类别合并为一行
+
+    Args:
+        df: 数据
+        category: 类别列名
+        value: 汇总的数值列名，省略时统计每个类别的行数
+        n: 保留的类别数量
+        agg: 汇总方式，例如 sum、mean、max
+        other_label: 合并行的类别名称
+
+    Returns:
+        DataFrame，列为 category 和 value（省略 value 时为 count），按数值降序排列
+    """
+    if value is None:
+        totals = df[category].value_counts()
+        value = "count"
+    else:
+        totals = df.groupby(category)[value].agg(agg).sort_values(ascending=False)
+    head = totals.iloc[:n]
+    result = pd.DataFrame({category: head.index, value: head.to_numpy()})
+    if len(totals) > n:
+        rest = totals.iloc[n:]
+        if agg == "sum" or value == "count":
+            other = rest.sum()
+        else:
+            other = df.loc[df[category].isin(rest.index), value].agg(agg)
+        result.loc[len(result)] = [other_label, other]
+    return result
+
+
+# 注入到用户绘图代码执行环境中的函数
+HELPERS = {
+    "downsample_lttb": downsample_lttb,
+    "histogram_bins": histogram_bins,
+    "top_n_other": top_n_other,
+}
+
+
+def _json_size(items: list, indent: bool = True) -> int:
+    """抽样估计数据项写入图表文件后的字节数
+
+    indent 为 True 时按 pyecharts 输出 HTML 的缩进格式估计，否则按紧凑 JSON 估计
+    """
+    if not items:
+        return 0
+    step = max(len(items) // _SIZE_SAMPLE, 1)
+    sample = items[::step]
+    if indent:
+        text = json.dumps(sample, indent=4, default=str)
+        # 补上数据在选项中嵌套所需的缩进
+        size = len(text) + 4 * (_OPTIONS_DEPTH - 1) * text.count("\n")
+    else:
+        size = len(json.dumps(sample, separators=(",", ":"), default=str))
+    return int(size / len(sample) * len(items))
+
+
+def _pair_values(data: list) -> Optional[tuple]:
+    """拆分 pyecharts 的 [[x, y], ...] 或 [y, ...] 数据，包含其他数据项类型时返回 None"""
+    xs, ys = [], []
+    for item in data:
+        if isinstance(item, (list, tuple)) and len(item) == 2:
+            xs.append(item[0])
+            ys.append(item[1])
+        elif item is None or isinstance(item, (int, float)):
+            ys.append(item)
+        else:
+            return None
+    y = pd.to_numeric(pd.Series(ys, dtype=object), errors="coerce")
+    return xs if len(xs) == len(ys) else None, y.to_numpy(dtype=np.float64)
+
+
+def _reduce_categories(
+    options: dict, max_points: int, n_out: int, indent: bool
+) -> List[Reduction]:
+    """类别轴上的折线按 LTTB、柱状图按前 N 个加其他降采样，同时裁剪类别轴数据"""
+    axes = options.get("xAxis") or []
+    if len(axes) != 1 or not isinstance(axes[0].get("data"), list):
+        return []
+    categories = axes[0]["data"]
+    series = options.get("series") or []
+    if len(categories) <= max_points or not series:
+        return []
+    if any(len(s.get("data") or []) != len(categories) for s in series):
+        return []
+    kinds = {s.get("type") for s in series}
+    values = [_pair_values(s["data"]) for s in series]
+    if any(v is None for v in values):
+        return []
+    before = len(categories)
+    categories_size = _json_size(categories, indent)
+    sizes = [_json_size(s["data"], indent) for s in series]
+    if kinds == {"line"}:
+        axis = _numeric_axis(categories)
+        budget = max(n_out // len(series), 3)
+        keep = np.unique(
+            np.concatenate([lttb_indices(axis, y, budget) for _, y in values])
+        )
+        for s in series:
+            s["data"] = [s["data"][i] for i in keep]
+        axes[0]["data"] = [categories[i] for i in keep]
+        method = "lttb"
+    elif kinds == {"bar"}:
+        # 按各系列绝对值之和选出前 N 个类别，保持原有顺序，其余合并为“其他”
+        totals = np.nansum(np.abs(np.vstack([y for _, y in values])), axis=0)
+        keep = np.sort(np.argsort(-totals, kind="stable")[: n_out - 1])
+        rest = np.ones(before, dtype=bool)
+        rest[keep] = False
+        for s, (xs, y) in zip(series, values):
+            other = float(np.nansum(y[rest]))
+            s["data"] = [s["data"][i] for i in keep] + [
+                ["其他", other] if xs is not None else other
+            ]
+        axes[0]["data"] = [categories[i] for i in keep] + ["其他"]
+        method = "top_n"
+    else:
+        return []
+    saved = categories_size - _json_size(axes[0]["data"], indent)
+    return [
+        Reduction(
+            str(s.get("name")),
+            method,
+            before,
+            len(s["data"]),
+            saved // len(series) + size - _json_size(s["data"], indent),
+        )
+        for s, size in zip(series, sizes)
+    ]
+
+
+def reduce_chart(
+    chart,
+    max_points: int = CHART_MAX_POINTS,
+    n_out: int = CHART_TARGET_POINTS,
+    indent: bool = True,
+) -> List[Reduction]:
+    """对 pyecharts 图表中超过 max_points 个点的系列降采样
+
+    类别轴上的折线图使用 LTTB 并同步裁剪类别轴，柱状图保留前 N 个类别并合并其余类别；
+    数值轴上的折线逐个系列使用 LTTB。其他类型的系列保持不变。
+    Grid、Page 等组合图表中的子图表会逐个处理。
+    indent 表示图表以缩进格式（HTML）还是紧凑 JSON 输出，只影响减少字节数的估计。
+    """
+    if not max_points:
+        return []
+    reductions = []
+    for child in getattr(chart, "_charts", None) or []:
+        reductions += reduce_chart(child, max_points, n_out, indent)
+    options = getattr(chart, "options", None)
+    if not isinstance(options, dict):
+        return reductions
+    reductions += _reduce_categories(options, max_points, n_out, indent)
+    for s in options.get("series") or []:
+        data = s.get("data")
+        if s.get("type") != "line" or not isinstance(data, list):
+            continue
+        if len(data) <= max_points:
+            continue
+        values = _pair_values(data)
+        if values is None or values[0] is None:
+            continue
+        axis = _numeric_axis(pd.Series(values[0]))
+        if np.any(np.diff(axis) < 0):
+            continue
+        size = _json_size(data, indent)
+        s["data"] = [data[i] for i in lttb_indices(axis, values[1], n_out)]
+        reductions.append(
+            Reduction(
+                str(s.get("name")),
+                "lttb",
+                len(data),
+                len(s["data"]),
+                size - _json_size(s["data"], indent),
+            )
+        )
+    return reductions
+
+
+def reduce_figure(
+    figure, max_points: int = CHART_MAX_POINTS, n_out: int = CHART_TARGET_POINTS
+) -> List[Reduction]:
+    """对 matplotlib 图形中超过 max_points 个点、x 升序的折线使用 LTTB 降采样"""
+    if not max_points:
+        return []
+    reductions = []
+    for ax in figure.axes:
+        for line in ax.get_lines():
+            x = np.asarray(line.get_xdata(orig=False), dtype=np.float64)
+            if len(x) <= max_points or np.any(np.diff(x) < 0):
+                continue
+            y = np.asarray(line.get_ydata(orig=False), dtype=np.float64)
+            keep = lttb_indices(x, y, n_out)
+            line.set_data(
+                np.asarray(line.get_xdata())[keep], np.asarray(line.get_ydata())[keep]
+            )
+            # 未设置图例的折线标签以下划线开头，改用序号
+            label = str(line.get_label())
+            if label.startswith("_"):
+                label = f"折线 {len(reductions) + 1}"
+            reductions.append(Reduction(label, "lttb", len(x), len(keep), 0))
+    return reductions
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_report(
+    reductions: List[Reduction], output_bytes: Optional[int] = None
+) -> str:
+    """生成降采样说明，output_bytes 为图表文件的实际大小"""
+    if not reductions:
+        return ""
+    methods = {"lttb": "LTTB", "top_n": "前 N 个类别 + 其他"}
+    lines = ["已自动降采样:"]
+    for r in reductions:
+        lines.append(f"  {r.name}: {r.before} → {r.after} 个点（{methods[r.method]}）")
+    saved = sum(r.saved_bytes for r in reductions)
+    if output_bytes is not None and saved > 0:
+        lines.append(
+            f"  文件大小 {_format_size(output_bytes)}，"
+            f"未降采样时约 {_format_size(output_bytes + saved)}"
+        )
+    return "\n".join(lines)
+
+
+def render_chart(chart, save_path: str, max_points: Optional[int] = None) -> str:
+    """降采样后按扩展名保存 pyecharts 图表（HTML 或选项 JSON），返回降采样说明"""
+    fmt = echarts_format(save_path)
+    max_points = CHART_MAX_POINTS if max_points is None else max_points
+    reductions = reduce_chart(
+        chart, max_points, min(CHART_TARGET_POINTS, max_points), fmt == "html"
+    )
+    save_echarts(chart, save_path)
+    # gzip 压缩后的大小无法与估计的未压缩数据量比较，只列出降采样的点数
+    output_bytes = None if fmt == "json.gz" else os.path.getsize(save_path)
+    return format_report(reductions, output_bytes)
+
+
+def downsample_figure(figure, max_points: Optional[int] = None) -> str:
+    """保存前对 matplotlib 图形降采样，返回降采样说明"""
+    max_points = CHART_MAX_POINTS if max_points is None else max_points
+    return format_report(
+        reduce_figure(figure, max_points, min(CHART_TARGET_POINTS, max_points))
+    )
+
+
+def _benchmark(directory: str, rows: int = 1000000) -> None:
+    """对比百万点折线图降采样前后的 HTML 大小和耗时"""
+    import time
+    from pyecharts import options as opts
+    from pyecharts.charts import Line
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "时间": pd.date_range("2020-01-01", periods=rows, freq="min"),
+            "数值": rng.standard_normal(rows).cumsum(),
+        }
+    )
+
+    def build():
+        return (
+            Line()
+            .add_xaxis(df["时间"].dt.strftime("%Y-%m-%d %H:%M").tolist())
+            .add_yaxis("数值", df["数值"].round(3).tolist())
+            .set_global_opts(title_opts=opts.TitleOpts(title="百万点折线图"))
+        )
+
+    for name, max_points in (("完整数据", 0), ("自动降采样", CHART_MAX_POINTS)):
+        save_path = os.path.join(directory, f"lttb-{max_points}.html")
+        start = time.perf_counter()
+        report = render_chart(build(), save_path, max_points)
+        elapsed = time.perf_counter() - start
+        size = _format_size(os.path.getsize(save_path))
+        print(f"{name}: {elapsed:.2f}s，HTML {size}")
+        if report:
+            print(report)
+
+    start = time.perf_counter()
+    downsample_lttb(df, "时间", "数值", 2000)
+    print(f"downsample_lttb {rows} 行 → 2000 行: {time.perf_counter() - start:.3f}s")
+
+
+# 降采样基准: python -m src.downsample <输出目录>
+if __name__ == "__main__":
+    import sys
+
+    _benchmark(sys.argv[1] if len(sys.argv) > 1 else "./benchmark-output")
@@ -0,0 +1,199 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import importlib
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("excel-mcp")
+
+# (模块名, 工具名) -> 原始同步函数，进程池中的子进程通过导入模块重新注册
+_TOOL_FUNCTIONS: Dict[tuple, Callable[..., Any]] = {}
+
+
+def _parse_limits(value: str) -> Dict[str, int]:
+    """解析 'tool_a=1,tool_b=2' 格式的并发限制配置
+
+    无法解析或小于 1 的限制会被忽略，该工具使用默认并发上限；
+    上限为 0 的信号量会让该工具的每次调用永远等待
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limit = item.partition("=")
+        try:
+            parsed = int(limit)
+        except ValueError:
+            logger.warning(f"无法解析工具并发限制: {item}")
+            continue
+        if parsed < 1:
+            logger.warning(f"工具并发限制必须至少为 1，使用默认值: {item}")
+            continue
+        limits[name.strip()] = parsed
+    return limits
+
+
+def _call_registered(module_name: str, name: str, args: tuple, kwargs: dict) -> Any:
+    """在进程池子进程中执行已注册的工具函数"""
+    key = (module_name, name)
+    if key not in _TOOL_FUNCTIONS:
+        importlib.import_module(module_name)
+    return _TOOL_FUNCTIONS[key](*args, **kwargs)
+
+
+class _ToolStats:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": (
+                round(self.wait_seconds / finished * 1000, 1) if finished else 0.0
+            ),
+            "avg_run_ms": (
+                round(self.run_seconds / finished * 1000, 1) if finished else 0.0
+            ),
+        }
+
+
+class ToolExecutor:
+    """在有界的线程池或进程池中运行同步工具函数，避免阻塞 SSE 事件循环
+
+    每个工具有独立的并发上限，超过上限的调用在事件循环中排队等待，
+    排队深度、运行数量和耗时通过 stats() 暴露。
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        workers: int = 4,
+        default_limit: int = 0,
+        limits: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Args:
+            kind: 'thread' 或 'process'；进程池中各进程拥有独立的数据缓存
+            workers: 工作线程或进程数量
+            default_limit: 每个工具的默认并发上限，0 表示与 workers 相同
+            limits: 单独指定部分工具的并发上限
+        """
+        self.kind = kind if kind in ("thread", "process") else "thread"
+        self.workers = workers
+        if default_limit < 0:
+            logger.warning(f"默认并发上限 {default_limit} 无效，使用 workers={workers}")
+        self.default_limit = default_limit if default_limit > 0 else workers
+        self.limits = limits or {}
+        self._executor: Optional[Executor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ToolExecutor":
+        return cls(
+            kind=os.environ.get("EXCEL_TOOL_EXECUTOR", "thread").lower(),
+            workers=int(os.environ.get("EXCEL_TOOL_WORKERS", "4")),
+            default_limit=int(os.environ.get("EXCEL_TOOL_CONCURRENCY", "0")),
+            limits=_parse_limits(os.environ.get("EXCEL_TOOL_CONCURRENCY_LIMITS", "")),
+        )
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="excel-tool"
+                    )
+            return self._executor
+
+    def _get_stats(self, name: str) -> _ToolStats:
+        with self._lock:
+            if name not in self._stats:
+                self._stats[name] = _ToolStats(
+                    self.limits.get(name, self.default_limit)
+                )
+                self._semaphores[name] = asyncio.Semaphore(self._stats[name].limit)
+            return self._stats[name]
+
+    def offload(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """装饰器：把同步工具函数包装为在工作池中执行的异步函数
+
+        保留原函数签名和文档，FastMCP 据此生成工具参数定义
+        """
+        name = fn.__name__
+        _TOOL_FUNCTIONS[(fn.__module__, name)] = fn
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            stats = self._get_stats(name)
+            semaphore = self._semaphores[name]
+            loop = asyncio.get_running_loop()
+            queued_at = time.perf_counter()
+            stats.queued += 1
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.queued)
+            started = False
+            try:
+                async with semaphore:
+                    stats.queued -= 1
+                    stats.running += 1
+                    started = True
+                    started_at = time.perf_counter()
+                    stats.wait_seconds += started_at - queued_at
+                    try:
+                        if self.kind == "process":
+                            call = functools.partial(
+                                _call_registered, fn.__module__, name, args, kwargs
+                            )
+                        else:
+                            call = functools.partial(fn, *args, **kwargs)
+                        result = await loop.run_in_executor(self._get_executor(), call)
+                        stats.completed += 1
+                        return result
+                    except Exception:
+                        stats.failed += 1
+                        raise
+                    finally:
+                        stats.running -= 1
+                        stats.run_seconds += time.perf_counter() - started_at
+            finally:
+                if not started:
+                    # 排队期间被取消
+                    stats.queued -= 1
+
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        """返回工作池配置和每个工具的排队、运行统计"""
+        with self._lock:
+            tools = {name: s.as_dict() for name, s in self._stats.items()}
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "queued": sum(t["queued"] for t in tools.values()),
+            "running": sum(t["running"] for t in tools.values()),
+            "tools": tools,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
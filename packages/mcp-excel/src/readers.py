@@ -0,0 +1,247 @@
+import os
+import sys
+import time
+import logging
+import operator
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger("excel-mcp")
+
+# CSV 解析引擎：pandas（默认 C 解析器 + NumPy 类型）或 pyarrow（多线程解析 + Arrow 类型）
+CSV_ENGINE = os.environ.get("EXCEL_CSV_ENGINE", "pandas").lower()
+# pyarrow 引擎下是否对低基数字符串列做字典编码（转为 pandas Categorical）
+CSV_DICT_ENCODE = os.environ.get("EXCEL_CSV_DICT_ENCODE", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# 字典编码的最大基数，超过后该列保持普通字符串
+CSV_DICT_MAX_CARDINALITY = int(
+    os.environ.get("EXCEL_CSV_DICT_MAX_CARDINALITY", "10000")
+)
+
+
+# 简单谓词的运算符，过滤条件为 [(列名, 运算符, 值), ...]，多个条件之间为 AND
+_FILTER_OPS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+Filters = Optional[Sequence[Sequence[Any]]]
+
+
+def _check_filters(filters: Filters) -> List[tuple]:
+    checked = []
+    for condition in filters or []:
+        if len(condition) != 3:
+            raise ValueError(f"过滤条件必须是 (列名, 运算符, 值) 形式: {condition}")
+        column, op, value = condition
+        if op not in _FILTER_OPS and op not in ("in", "not in"):
+            raise ValueError(f"不支持的过滤运算符: {op}")
+        checked.append((column, op, value))
+    return checked
+
+
+def read_columns(columns: Optional[List[str]], filters: Filters) -> Optional[List[str]]:
+    """实际需要读取的列：投影列加上过滤条件引用的列"""
+    if columns is None:
+        return None
+    return list(dict.fromkeys(list(columns) + [c[0] for c in _check_filters(filters)]))
+
+
+def apply_filters(df: pd.DataFrame, filters: Filters) -> pd.DataFrame:
+    """在 DataFrame 上应用过滤条件"""
+    mask = None
+    for column, op, value in _check_filters(filters):
+        if op == "in":
+            condition = df[column].isin(value)
+        elif op == "not in":
+            condition = ~df[column].isin(value)
+        else:
+            condition = _FILTER_OPS[op](df[column], value)
+        mask = condition if mask is None else mask & condition
+    return df if mask is None else df[mask.fillna(False).astype(bool)]
+
+
+def project_frame(
+    df: pd.DataFrame, columns: Optional[List[str]] = None, filters: Filters = None
+) -> pd.DataFrame:
+    """从完整的 DataFrame 中选出指定列和满足条件的行"""
+    if filters:
+        df = apply_filters(df, filters)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def project_table(table, columns: Optional[List[str]] = None, filters: Filters = None):
+    """在 Arrow 表上执行过滤和列选择，只有被选中的列会被转换为 pandas
+
+    过滤条件无法用 Arrow 表达式计算时（如字符串与时间列比较）返回 None，
+    由调用方转换后再用 apply_filters 过滤
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    needed = read_columns(columns, filters)
+    if needed is not None:
+        table = table.select(needed)
+    if filters:
+        expression = None
+        for column, op, value in _check_filters(filters):
+            field = pc.field(column)
+            if op == "in":
+                condition = field.isin(value)
+            elif op == "not in":
+                condition = ~field.isin(value)
+            else:
+                condition = _FILTER_OPS[op](field, value)
+            expression = condition if expression is None else expression & condition
+        try:
+            table = table.filter(expression)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError):
+            return None
+    if columns is not None:
+        table = table.select(list(columns))
+    return table
+
+
+def _arrow_types_mapper(dict_encode: bool):
+    """Arrow 类型到 pandas 类型的映射
+
+    字典编码列交给 pyarrow 默认转换为 Categorical，时间列转换为 pandas 原生的
+    datetime64，便于 resample 和 JSON 输出，其余列使用 ArrowDtype
+    """
+    import pyarrow as pa
+
+    def mapper(arrow_type):
+        if dict_encode and pa.types.is_dictionary(arrow_type):
+            return None
+        if pa.types.is_timestamp(arrow_type):
+            return None
+        return pd.ArrowDtype(arrow_type)
+
+    return mapper
+
+
+def _read_csv_pyarrow(
+    filepath: str,
+    dict_encode: bool,
+    columns: Optional[List[str]] = None,
+    filters: Filters = None,
+) -> pd.DataFrame:
+    """使用 pyarrow.csv 多线程解析，返回 Arrow 类型的 DataFrame
+
+    只解析需要的列，过滤条件在 Arrow 表上计算后再转换为 pandas
+    """
+    import pyarrow.csv as pacsv
+
+    table = pacsv.read_csv(
+        filepath,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=read_columns(columns, filters),
+            # 与 pandas 一致，空字符串等缺失标记视为空值
+            strings_can_be_null=True,
+            auto_dict_encode=dict_encode,
+            auto_dict_max_cardinality=CSV_DICT_MAX_CARDINALITY,
+        ),
+    )
+    projected = project_table(table, columns, filters)
+    df = (table if projected is None else projected).to_pandas(
+        types_mapper=_arrow_types_mapper(dict_encode),
+        coerce_temporal_nanoseconds=True,
+    )
+    return project_frame(df, columns, filters) if projected is None else df
+
+
+def read_csv_frame(
+    filepath,
+    engine: str = None,
+    columns: Optional[List[str]] = None,
+    filters: Filters = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """按部署配置的引擎读取 CSV 文件
+
+    Args:
+        filepath: 文件路径或二进制文件对象
+        engine: 'pandas' 或 'pyarrow'，默认使用 EXCEL_CSV_ENGINE
+        columns: 只读取的列，None 表示读取所有列
+        filters: 过滤条件 [(列名, 运算符, 值), ...]，支持 == != < <= > >= in / not in
+        **kwargs: 额外的参数，会传递给 pd.read_csv
+
+    Returns:
+        pd.DataFrame: 读取的数据
+    """
+    engine = engine or CSV_ENGINE
+    usecols = read_columns(columns, filters)
+    if engine == "pyarrow":
+        try:
+            if not kwargs:
+                return _read_csv_pyarrow(filepath, CSV_DICT_ENCODE, columns, filters)
+            df = pd.read_csv(
+                filepath,
+                engine="pyarrow",
+                dtype_backend="pyarrow",
+                usecols=usecols,
+                **kwargs,
+            )
+            return project_frame(df, columns, filters)
+        except ImportError:
+            logger.warning("未安装 pyarrow，回退到 pandas CSV 解析器")
+        except ValueError as e:
+            # pyarrow 引擎不支持的参数，或者无法按 Arrow 类型解析的数据
+            logger.warning(f"pyarrow 解析 CSV 失败，回退到 pandas: {e}")
+        if hasattr(filepath, "seek"):
+            filepath.seek(0)
+    if usecols is not None:
+        kwargs["usecols"] = usecols
+    return project_frame(pd.read_csv(filepath, **kwargs), columns, filters)
+
+
+def _measure_csv_read(filepath: str, engine: str, queue) -> None:
+    import resource
+
+    start = time.perf_counter()
+    df = read_csv_frame(filepath, engine=engine)
+    elapsed = time.perf_counter() - start
+    queue.put(
+        {
+            "engine": engine,
+            "seconds": round(elapsed, 3),
+            "frame_mb": round(float(df.memory_usage(deep=True).sum()) / 1024 / 1024, 1),
+            # Linux 下 ru_maxrss 的单位是 KB
+            "peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+        }
+    )
+
+
+def benchmark_csv_engines(filepath: str, engines=("pandas", "pyarrow")) -> list:
+    """在独立子进程中分别用各引擎读取 CSV，比较解析耗时和常驻内存峰值"""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for engine in engines:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_measure_csv_read, args=(filepath, engine, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+# 对比两种 CSV 解析路径: python -m src.readers <csv文件>
+if __name__ == "__main__":
+    for row in benchmark_csv_engines(sys.argv[1]):
+        print(row)
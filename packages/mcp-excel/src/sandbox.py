@@ -0,0 +1,373 @@
+import io
+import os
+import sys
+import signal
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from .charts import configure, save_figure
+from .code_runner import capture_stdout, run_python_code
+from .downsample import HELPERS, downsample_figure, render_chart
+
+logger = logging.getLogger("excel-mcp")
+
+# 用户代码的执行位置：inline（服务进程内 exec）或 process（预热的沙箱进程池）
+CODE_SANDBOX = os.environ.get("EXCEL_CODE_SANDBOX", "inline").lower()
+SANDBOX_WORKERS = int(os.environ.get("EXCEL_SANDBOX_WORKERS", "2"))
+# 每个沙箱进程执行多少个任务后被回收，释放用户代码残留的内存和全局状态
+SANDBOX_MAX_TASKS = int(os.environ.get("EXCEL_SANDBOX_MAX_TASKS", "50"))
+# 单个任务的 CPU 时间上限（秒）和每个沙箱进程的地址空间上限（MB），0 表示不限制
+SANDBOX_CPU_SECONDS = int(os.environ.get("EXCEL_SANDBOX_CPU_SECONDS", "60"))
+SANDBOX_MEMORY_MB = int(os.environ.get("EXCEL_SANDBOX_MEMORY_MB", "0"))
+
+# 沙箱进程启动时预先导入的模块，fork server 导入一次后所有工作进程直接继承
+WARM_MODULES = ["numpy", "pandas", "pyarrow", "matplotlib", "pyecharts", "cpca"]
+
+
+class CPUTimeExceeded(Exception):
+    """用户代码超出 CPU 时间上限"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPUTimeExceeded(f"代码执行超出 CPU 时间上限 ({SANDBOX_CPU_SECONDS} 秒)")
+
+
+def _warm_worker(memory_mb: int) -> None:
+    """沙箱进程初始化：预热导入、配置 matplotlib 并设置资源限制"""
+    configure()
+
+    for name in WARM_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    try:
+        import resource
+
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+        if memory_mb > 0:
+            limit = memory_mb * 1024 * 1024
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ImportError, AttributeError, ValueError, OSError) as e:
+        logger.warning(f"无法设置沙箱进程资源限制: {e}")
+
+
+class _CPULimit:
+    """为当前任务设置 CPU 时间软限制
+
+    RLIMIT_CPU 统计的是进程累计 CPU 时间，进程会被复用，
+    因此上限设为已用时间加上单个任务的预算，任务结束后恢复
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.previous = None
+
+    def __enter__(self):
+        if self.seconds <= 0:
+            return self
+        try:
+            import resource
+
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime) + 1
+            self.previous = resource.getrlimit(resource.RLIMIT_CPU)
+            hard = self.previous[1]
+            soft = used + self.seconds
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        except (ImportError, ValueError, OSError):
+            self.previous = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.previous is not None:
+            import resource
+
+            resource.setrlimit(resource.RLIMIT_CPU, self.previous)
+        return False
+
+
+def _encode_frame(df: pd.DataFrame):
+    """把 DataFrame 以 Arrow IPC 格式写入共享内存
+
+    Returns:
+        (SharedMemory, 引用)；无法转换为 Arrow 的数据返回 (None, None)
+    """
+    if not all(isinstance(col, str) for col in df.columns):
+        return None, None
+    try:
+        import pyarrow as pa
+        from multiprocessing import shared_memory
+
+        table = pa.Table.from_pandas(df, preserve_index=None)
+        sink = pa.MockOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        size = sink.size()
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            stream = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+            with pa.ipc.new_file(stream, table.schema) as writer:
+                writer.write_table(table)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            raise
+        return shm, ("shm", shm.name, size)
+    except Exception as e:
+        logger.warning(f"无法通过共享内存传递数据，回退到 pickle: {e}")
+        return None, None
+
+
+def _decode_frame(ref: tuple) -> Tuple[pd.DataFrame, Any]:
+    """在沙箱进程中还原 DataFrame，返回 (DataFrame, 需要在任务结束后关闭的句柄)"""
+    kind = ref[0]
+    if kind == "pickle":
+        return ref[1], None
+    import pyarrow as pa
+
+    if kind == "arrow_file":
+        with pa.memory_map(ref[1], "r") as source:
+            return pa.ipc.open_file(source).read_all().to_pandas(), None
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=ref[1])
+    buffer = pa.py_buffer(shm.buf).slice(0, ref[2])
+    df = pa.ipc.open_file(buffer).read_all().to_pandas()
+    return df, shm
+
+
+def _run_job(
+    mode: str,
+    ref: tuple,
+    python_code: str,
+    save_path: Optional[str],
+    dpi: Optional[int] = None,
+    max_points: Optional[int] = None,
+):
+    """沙箱进程中执行用户代码
+
+    Args:
+        mode: log / transform / plot / pyecharts，与 ExcelDataHandler 的各个 run_code 方法对应
+        ref: DataFrame 的传递方式，见 CodeSandbox.run
+        python_code: 用户代码，必须定义 main 函数
+        save_path: 图表保存的绝对路径
+        dpi: plot 模式的位图分辨率
+        max_points: plot / pyecharts 模式自动降采样的点数阈值
+
+    Returns:
+        (捕获的标准输出, 结果)；log 模式结果为字符串，transform 模式为 DataFrame 或字典，
+        plot / pyecharts 模式为降采样说明
+    """
+    df, handle = _decode_frame(ref)
+    output_buffer = io.StringIO()
+    exec_locals = None
+    result = None
+    try:
+        with _CPULimit(SANDBOX_CPU_SECONDS), capture_stdout(output_buffer):
+            exec_globals = {"pd": pd}
+            if mode in ("plot", "pyecharts"):
+                exec_globals.update(HELPERS)
+            if mode == "plot":
+                import matplotlib.pyplot as plt
+
+                exec_globals["plt"] = plt
+            exec_locals = {"df": df}
+            run_python_code(python_code, exec_globals, exec_locals)
+            if "main" not in exec_locals:
+                raise ValueError("代码中必须定义main函数")
+            main = exec_locals["main"]
+
+            if mode == "plot":
+                try:
+                    main(df, plt)
+                    result = downsample_figure(plt.gcf(), max_points)
+                    save_figure(plt.gcf(), save_path, dpi)
+                finally:
+                    plt.close("all")
+            elif mode == "pyecharts":
+                result = render_chart(main(df), save_path, max_points)
+            elif mode == "transform":
+                result = main(df)
+                if isinstance(result, dict):
+                    if not all(isinstance(v, pd.DataFrame) for v in result.values()):
+                        raise TypeError("当返回字典时，所有值必须是DataFrame类型")
+                elif not isinstance(result, pd.DataFrame):
+                    raise TypeError(
+                        "main函数必须返回DataFrame或Dict[str,DataFrame]类型"
+                    )
+            else:
+                # 结果对象可能无法序列化，直接在沙箱中转换为字符串
+                result = f"{main(df)}"
+        return output_buffer.getvalue(), result
+    finally:
+        del df, exec_locals
+        if handle is not None:
+            try:
+                handle.close()
+            except BufferError:
+                # 用户代码仍持有共享内存上的视图，映射随进程回收释放
+                pass
+
+
+class CodeSandbox:
+    """执行用户 Python 代码的预热进程池
+
+    工作进程由 fork server 派生，pandas、numpy、matplotlib、pyecharts、cpca
+    只在 fork server 中导入一次。DataFrame 优先以磁盘缓存的 Arrow 文件路径传递，
+    其次以 Arrow IPC 写入共享内存，无法转换为 Arrow 的数据回退到 pickle。
+    CPU 密集的用户代码在独立进程中运行，不再占用服务进程的 GIL。
+    """
+
+    def __init__(
+        self,
+        workers: int = SANDBOX_WORKERS,
+        max_tasks: int = SANDBOX_MAX_TASKS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+    ):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self.memory_mb = memory_mb
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "jobs": 0,
+            "failed": 0,
+            "restarts": 0,
+            "arrow_file": 0,
+            "shm": 0,
+            "pickle": 0,
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                if "forkserver" in methods:
+                    ctx = multiprocessing.get_context("forkserver")
+                    ctx.set_forkserver_preload(WARM_MODULES)
+                else:
+                    ctx = multiprocessing.get_context("spawn")
+                options = {}
+                if sys.version_info >= (3, 11) and self.max_tasks > 0:
+                    options["max_tasks_per_child"] = self.max_tasks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=ctx,
+                    initializer=_warm_worker,
+                    initargs=(self.memory_mb,),
+                    **options,
+                )
+            return self._pool
+
+    def warm_up(self) -> None:
+        """提前启动所有工作进程，避免第一次调用承担导入开销"""
+        pool = self._get_pool()
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def run(
+        self,
+        mode: str,
+        python_code: str,
+        df: Optional[pd.DataFrame] = None,
+        arrow_file: Optional[str] = None,
+        save_path: Optional[str] = None,
+        dpi: Optional[int] = None,
+        max_points: Optional[int] = None,
+    ) -> Tuple[str, Any]:
+        """在沙箱进程中执行用户代码
+
+        Args:
+            mode: log / transform / plot / pyecharts
+            python_code: 用户代码
+            df: 输入数据，提供 arrow_file 时可以省略
+            arrow_file: 与输入数据内容一致的 Arrow IPC 文件，工作进程直接内存映射读取
+            save_path: 图表保存的绝对路径
+            dpi: plot 模式的位图分辨率
+            max_points: plot / pyecharts 模式自动降采样的点数阈值
+
+        Returns:
+            (捕获的标准输出, 结果)
+        """
+        shm = None
+        if arrow_file is not None:
+            ref = ("arrow_file", arrow_file)
+        else:
+            shm, ref = _encode_frame(df)
+            if ref is None:
+                ref = ("pickle", df)
+        with self._lock:
+            self._stats["jobs"] += 1
+            self._stats[ref[0]] += 1
+        try:
+            future = self._get_pool().submit(
+                _run_job, mode, ref, python_code, save_path, dpi, max_points
+            )
+            return future.result()
+        except BrokenProcessPool:
+            self._restart()
+            raise RuntimeError("代码执行进程异常退出，可能超出了内存限制")
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def _restart(self) -> None:
+        with self._lock:
+            self._stats["failed"] += 1
+            self._stats["restarts"] += 1
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_tasks_per_worker": self.max_tasks,
+                **self._stats,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+_sandbox: Optional[CodeSandbox] = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox() -> Optional[CodeSandbox]:
+    """按部署配置返回沙箱实例，inline 模式返回 None"""
+    global _sandbox
+    if CODE_SANDBOX != "process":
+        return None
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = CodeSandbox()
+        return _sandbox
+
+
+def shutdown_sandbox() -> None:
+    with _sandbox_lock:
+        if _sandbox is not None:
+            _sandbox.shutdown()
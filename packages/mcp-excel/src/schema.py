@@ -0,0 +1,94 @@
+import io
+import os
+import zipfile
+import logging
+from typing import List, Optional, Tuple
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from .readers import read_csv_frame
+
+logger = logging.getLogger("excel-mcp")
+
+# 推断列类型时读取的最大行数，以及 CSV 文件读取的最大字节数
+SCHEMA_SAMPLE_ROWS = int(os.environ.get("EXCEL_SCHEMA_SAMPLE_ROWS", "1000"))
+SCHEMA_CSV_SAMPLE_BYTES = (
+    int(os.environ.get("EXCEL_SCHEMA_CSV_SAMPLE_KB", "256")) * 1024
+)
+
+ZIP_WORKBOOK_SUFFIXES = (".xlsx", ".xlsm", ".xltx", ".xltm")
+
+ColumnSchema = List[Tuple[str, str]]
+
+
+def read_sheet_names(filepath: str) -> List[str]:
+    """只读取工作簿元数据获取工作表名称，不解析任何单元格
+
+    xlsx 系列直接读取压缩包中的 xl/workbook.xml，其他格式使用 calamine 读取
+    """
+    if filepath.lower().endswith(ZIP_WORKBOOK_SUFFIXES):
+        try:
+            with zipfile.ZipFile(filepath) as archive:
+                with archive.open("xl/workbook.xml") as f:
+                    names = [
+                        elem.attrib["name"]
+                        for _, elem in ElementTree.iterparse(f)
+                        if elem.tag.rsplit("}", 1)[-1] == "sheet"
+                        and "name" in elem.attrib
+                    ]
+            if names:
+                return names
+        except (KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+            logger.warning(f"读取 workbook.xml 失败，回退到 calamine: {e}")
+
+    from python_calamine import CalamineWorkbook
+
+    workbook = CalamineWorkbook.from_path(filepath)
+    try:
+        return list(workbook.sheet_names)
+    finally:
+        workbook.close()
+
+
+def _read_csv_head(filepath: str, sample_bytes: int, **kwargs) -> pd.DataFrame:
+    """只解析 CSV 文件的前 sample_bytes 字节，在最后一个完整行处截断"""
+    with open(filepath, "rb") as f:
+        head = f.read(sample_bytes + 1)
+    if len(head) > sample_bytes:
+        last_newline = head.rfind(b"\n", 0, sample_bytes)
+        if last_newline < 0:
+            # 单行超过采样大小，只能按行数读取
+            return pd.read_csv(filepath, nrows=SCHEMA_SAMPLE_ROWS, **kwargs)
+        head = head[: last_newline + 1]
+    try:
+        # 与完整读取使用相同的解析引擎，保证推断出的类型一致
+        return read_csv_frame(io.BytesIO(head), **kwargs)
+    except (pd.errors.ParserError, UnicodeDecodeError):
+        # 截断位置可能落在带引号的多行字段中
+        return pd.read_csv(filepath, nrows=SCHEMA_SAMPLE_ROWS, **kwargs)
+
+
+def probe_columns(
+    filepath: str, sheet_name: Optional[str], is_csv: bool
+) -> ColumnSchema:
+    """根据表头和有限的样本行推断列名和数据类型
+
+    Args:
+        filepath: 文件完整路径
+        sheet_name: 工作表名称，对于CSV文件此参数将被忽略
+        is_csv: 是否为CSV文件
+
+    Returns:
+        ColumnSchema: [(列名, 类型名称)] 列表
+    """
+    if is_csv:
+        sample = _read_csv_head(filepath, SCHEMA_CSV_SAMPLE_BYTES)
+    else:
+        sample = pd.read_excel(
+            filepath,
+            sheet_name=sheet_name if sheet_name is not None else 0,
+            engine="calamine",
+            nrows=SCHEMA_SAMPLE_ROWS,
+        )
+    return [(col, str(dtype)) for col, dtype in sample.dtypes.items()]
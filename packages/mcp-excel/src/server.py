@@ -1,17 +1,22 @@
+import asyncio
 import logging
 import sys
 import os
 from os import path
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict, Optional, Union
 from fastmcp import FastMCP, Context
 import pandas as pd
 from dotenv import load_dotenv
-from .data_handlers import ExcelDataHandler as ExcelHandler
 
-# 加载 .env 文件
+# 加载 .env 文件，需要在导入数据处理模块之前完成，缓存等配置在导入时读取
 load_dotenv()
 
-os.environ["MODIN_ENGINE"] = "dask"
+from .data_handlers import ExcelDataHandler as ExcelHandler
+from .cache import get_cache_stats
+from .executor import ToolExecutor
+from .sandbox import get_sandbox, shutdown_sandbox
+from . import charts, timeseries
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +31,9 @@ EXCEL_FILES_PATH = os.environ.get("EXCEL_FILES_PATH", "./filesystem")
 
 os.makedirs(EXCEL_FILES_PATH, exist_ok=True)
 
+# 工具函数在工作池中执行，避免耗时的 pandas 计算阻塞 SSE 事件循环
+tool_executor = ToolExecutor.from_env()
+
 
 # Initialize FastMCP server
 mcp = FastMCP(
@@ -36,6 +44,7 @@ mcp = FastMCP(
 
 
 @mcp.tool()
+@tool_executor.offload
 def list_worksheets(filepath: str) -> List[str]:
     """获取指定Excel或CSV文件中的所有工作表名称。
 
@@ -72,23 +81,21 @@ def analyze_data_overview(filepath: str, sheet_name: str) -> str:
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        # 读取数据
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
+        # 从共享的列画像中渲染概览，不再单独扫描数据
+        profile = excel_handler.get_profile(filepath, sheet_name)
         # 获取行列数据
-        num_rows, num_cols = df.shape
+        num_rows, num_cols = profile["rows"], len(profile["columns"])
         # 获取缺失值信息
-        missing_values_info = excel_handler.get_missing_values_info(df)
+        missing_values_info = excel_handler.format_missing_values(profile)
 
         # 将数据类型信息转换为字符串格式
         dtypes_str = "\n".join(
-            [f"    {col}: {dtype}" for col, dtype in df.dtypes.items()]
+            [f"    {col}: {info['dtype']}" for col, info in profile["columns"].items()]
         )
 
         # 将非空值计数转换为字符串格式
         non_null_str = "\n".join(
-            [f"    {col}: {count}" for col, count in df.count().items()]
+            [f"    {col}: {info['count']}" for col, info in profile["columns"].items()]
         )
 
         # 将缺失值信息转换为字符串
@@ -123,6 +130,7 @@ def analyze_data_overview(filepath: str, sheet_name: str) -> str:
 
 
 @mcp.tool()
+@tool_executor.offload
 def list_columns(filepath: str, sheet_name: str) -> str:
     """获取文件中指定工作表的所有列名及其数据类型。
 
@@ -139,28 +147,16 @@ def list_columns(filepath: str, sheet_name: str) -> str:
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
-        columns = df.columns.tolist()
-        dtypes = df.dtypes
-        # 计算列名最大长度用于对齐
-        max_col_len = max(len(str(col)) for col in columns) if columns else 0
-        max_col_len = max(max_col_len, 10)  # 最小宽度为10
-
-        # 生成格式化的表格输出
-        header = f"共 {len(columns)} 列\n" + "-" * (max_col_len + 10) + "\n"
-        header += f"{'列名'.ljust(max_col_len)}    类型\n"
-        header += "-" * (max_col_len + 10) + "\n"
-
-        rows = [f"{str(col).ljust(max_col_len)}    {dtypes[col]}" for col in columns]
-        return header + "\n".join(rows)
+        # 只探测表头和样本行，不读取完整工作表
+        schema, sampled = excel_handler.get_column_types(filepath, sheet_name)
+        return excel_handler.format_column_types(schema, sampled)
     except Exception as e:
         logger.error(f"Error getting Excel columns: {e}")
         raise
 
 
 @mcp.tool()
+@tool_executor.offload
 def analyze_missing_values(filepath: str, sheet_name: str) -> str:
     """获取Excel或CSV文件中的数据缺失情况。
 
@@ -177,16 +173,18 @@ def analyze_missing_values(filepath: str, sheet_name: str) -> str:
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
-        return excel_handler.get_missing_values_info(df)
+        analyzer = excel_handler.get_chunked_analyzer(filepath)
+        if analyzer is not None:
+            return excel_handler.format_missing_values(analyzer.missing_values())
+        profile = excel_handler.get_profile(filepath, sheet_name)
+        return excel_handler.format_missing_values(profile)
     except Exception as e:
         logger.error(f"Error getting Excel sheet missing values info: {e}")
         raise
 
 
 @mcp.tool()
+@tool_executor.offload
 def analyze_unique_values(
     filepath: str,
     sheet_name: str,
@@ -208,11 +206,9 @@ def analyze_unique_values(
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
-        return excel_handler.get_data_unique_values(
-            df, columns=None, max_unique=max_unique
+        profile = excel_handler.get_profile(filepath, sheet_name, top_k=max_unique)
+        return excel_handler.format_unique_values(
+            profile, columns=None, max_unique=max_unique
         )
     except Exception as e:
         logger.error(f"Error getting Excel sheet unique values: {e}")
@@ -220,6 +216,7 @@ def analyze_unique_values(
 
 
 @mcp.tool()
+@tool_executor.offload
 def analyze_correlations(
     filepath: str,
     sheet_name: str,
@@ -243,16 +240,16 @@ def analyze_correlations(
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
+        return excel_handler.get_correlations(
+            filepath, sheet_name, method, min_correlation
         )
-        return excel_handler.get_column_correlation(df, method, min_correlation)
     except Exception as e:
         logger.error(f"Error calculating Excel sheet correlations: {e}")
         raise
 
 
 @mcp.tool()
+@tool_executor.offload
 def print_data_log(filepath: str, sheet_name: str, python_code: str) -> str:
     """用于执行Python代码并捕获输出的数据观察工具。
 
@@ -298,6 +295,7 @@ def print_data_log(filepath: str, sheet_name: str, python_code: str) -> str:
 
 
 @mcp.tool()
+@tool_executor.offload
 def save_transformed_data(
     filepath: str,
     sheet_name: str,
@@ -314,10 +312,12 @@ def save_transformed_data(
                    当返回DataFrame时，数据将保存到default_sheet_name指定的工作表中；
                    当返回Dict[str, DataFrame]时，字典的键为工作表名称，值为对应的DataFrame。
                    函数应为纯函数，避免副作用。
-        result_file_path: 结果文件保存路径
+        result_file_path: 结果文件保存路径，扩展名决定格式：.xlsx、.csv、.parquet 或 .feather。
+                   .csv、.parquet、.feather 没有工作表，返回多个工作表时每个工作表分别写入
+                   {文件名}-{工作表名}{扩展名}，例如 out/result.csv 写入 out/result-monthly_summary.csv
         default_sheet_name: 默认工作表名称，当python_code返回单个DataFrame时使用
     Returns:
-        str: 执行结果信息，包含生成的工作表信息
+        str: 执行结果信息，包含实际生成的文件路径，多个文件以逗号分隔
 
     Example:
         # 返回单个DataFrame的示例
@@ -350,19 +350,26 @@ def save_transformed_data(
 
 
 @mcp.tool()
+@tool_executor.offload
 def plot_matplotlib_chart(
     filepath: str,
     sheet_name: str,
     save_path: str,
     python_code: str,
+    dpi: Optional[int] = None,
+    max_points: Optional[int] = None,
 ) -> str:
     """绘制Excel或CSV数据的可视化图表专用函数。
 
     Args:
         filepath: 源文件路径
         sheet_name: 工作表名称（对于CSV文件，此参数将被忽略）
-        save_path: 图表保存路径
-        python_code: 要执行的Python代码，定义为 def main(df, plt)，可以使用 matplotlib 进行可视化, 返回 plt 对象，不用保存
+        save_path: 图表保存路径，扩展名决定输出格式：.png、.svg、.webp、.jpg 或 .pdf
+        python_code: 要执行的Python代码，定义为 def main(df, plt)，可以使用 matplotlib 进行可视化, 返回 plt 对象，不用保存。
+            可直接调用 downsample_lttb(df, x, y, n_out)、histogram_bins(series, bins)、
+            top_n_other(df, category, value, n) 预先减少数据点
+        dpi: 位图分辨率，默认 100，超过服务器上限时自动降低
+        max_points: 折线超过该点数时自动用 LTTB 降采样，默认使用服务器配置，0 表示不降采样
 
     Returns:
         str: 执行结果信息，请提供给用户结果文件相对路径
@@ -374,7 +381,12 @@ def plot_matplotlib_chart(
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
         return excel_handler.run_code_with_plot(
-            filepath, python_code, save_path, sheet_name=sheet_name
+            filepath,
+            python_code,
+            save_path,
+            dpi=dpi,
+            max_points=max_points,
+            sheet_name=sheet_name,
         )
 
     except Exception as e:
@@ -383,22 +395,29 @@ def plot_matplotlib_chart(
 
 
 @mcp.tool()
+@tool_executor.offload
 def plot_pyecharts_chart(
     filepath: str,
     sheet_name: str,
     save_path: str,
     python_code: str,
+    max_points: Optional[int] = None,
 ) -> str:
     """使用pyecharts生成交互式图表的专用函数。
 
     Args:
         filepath: Excel文件路径
         sheet_name: 工作表名称
-        save_path: 图表保存路径，必须以.html结尾
-        python_code: 要执行的Python代码，定义为 def main(df)，返回一个pyecharts图表对象
+        save_path: 图表保存路径。以 .html 结尾时保存完整网页；以 .json 结尾时只保存紧凑的图表选项 JSON，
+            体积更小，可由前端 ECharts 直接渲染；以 .json.gz 结尾时再用 gzip 压缩
+        python_code: 要执行的Python代码，定义为 def main(df)，返回一个pyecharts图表对象。
+            可直接调用 downsample_lttb(df, x, y, n_out)、histogram_bins(series, bins)、
+            top_n_other(df, category, value, n) 预先减少数据点
+        max_points: 系列超过该点数时自动降采样（折线用 LTTB，柱状图保留前 N 个类别并合并其余类别），
+            默认使用服务器配置，0 表示不降采样
 
     Returns:
-        str: 执行结果信息，包含生成的HTML文件路径
+        str: 执行结果信息，包含生成的图表文件路径
 
     Raises:
         ValueError: 当图表类型不支持或数据列不存在时
@@ -408,7 +427,11 @@ def plot_pyecharts_chart(
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
         return excel_handler.run_code_with_pyecharts(
-            filepath, python_code, save_path, sheet_name=sheet_name
+            filepath,
+            python_code,
+            save_path,
+            max_points=max_points,
+            sheet_name=sheet_name,
         )
     except Exception as e:
         logger.error(f"生成pyecharts图表时出错: {e}")
@@ -416,6 +439,7 @@ def plot_pyecharts_chart(
 
 
 @mcp.tool()
+@tool_executor.offload
 def analyze_numeric_stats(
     filepath: str, sheet_name: str, columns: List[str]
 ) -> Dict[str, Any]:
@@ -431,22 +455,7 @@ def analyze_numeric_stats(
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
-        numerical_cols = (
-            df.select_dtypes(include=["int64", "float64"]).columns
-            if columns is None
-            else columns
-        )
-
-        # 获取基本统计信息
-        stats = df[numerical_cols].describe()
-
-        # 计算数值列的和
-        sums = df[numerical_cols].sum(numeric_only=True, skipna=True)
-        stats.loc["sum"] = sums
-
+        stats = excel_handler.compute_numeric_stats(filepath, sheet_name, columns)
         return stats.to_json(orient="records", force_ascii=False)
     except Exception as e:
         logger.error(f"计算统计信息时出错: {e}")
@@ -454,87 +463,115 @@ def analyze_numeric_stats(
 
 
 @mcp.tool()
+@tool_executor.offload
 def analyze_group_stats(
     filepath: str,
     sheet_name: str,
-    group_by: str,
+    group_by: Union[str, List[str]],
     agg_columns: List[str],
     agg_functions: List[str] = ["mean", "count"],
+    top_n: int = 50,
+    offset: int = 0,
 ) -> str:
-    """按指定列分组并计算统计信息。
+    """按指定列分组并计算统计信息。结果按第一个统计列的第一个聚合函数降序排列并分页返回。
 
     Args:
         filepath: 源文件路径
         sheet_name: 工作表名称（对于CSV文件，此参数将被忽略）
-        group_by: 用于分组的列名
+        group_by: 用于分组的列名，或多个列名的列表
         agg_columns: 需要统计的列名列表
         agg_functions: 统计函数列表，支持 'mean', 'sum', 'count', 'min', 'max' 等
+        top_n: 返回的分组数量，默认 50
+        offset: 跳过的分组数量，用于查看后续分组，默认 0
 
     Returns:
-        str: 分组统计结果的字符串表示
+        str: 分组总数和当前页分组统计结果的字符串表示
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
+        grouped = excel_handler.compute_group_stats(
+            filepath, sheet_name, group_by, agg_columns, agg_functions
         )
-        grouped = df.groupby(group_by)[agg_columns].agg(agg_functions)
-        # 按第一个统计列的第一个聚合函数结果降序排序
-        first_col = agg_columns[0]
-        first_func = agg_functions[0]
-        sort_col = (
-            (first_col, first_func)
-            if isinstance(grouped.columns, pd.MultiIndex)
-            else first_col
+        return excel_handler.format_group_stats(
+            grouped, agg_columns, agg_functions, top_n, offset
         )
-        sorted_grouped = grouped.sort_values(by=sort_col, ascending=False)
-        return sorted_grouped.to_string()
     except Exception as e:
         logger.error(f"分组统计时出错: {e}")
         raise
 
 
 @mcp.tool()
+@tool_executor.offload
 def analyze_time_series(
-    filepath: str, sheet_name: str, date_column: str, value_column: str, freq: str = "M"
+    filepath: str,
+    sheet_name: str,
+    date_column: str,
+    value_column: Union[str, List[str]],
+    freq: Union[str, List[str]] = "M",
 ) -> str:
-    """对时间序列数据进行分析，包括趋势、季节性等。
+    """对时间序列数据进行分析，包括趋势、季节性等。可以一次分析多个值列和多个频率。
 
     Args:
         filepath: 源文件路径
         sheet_name: 工作表名称（对于CSV文件，此参数将被忽略）
-        date_column: 日期列名
-        value_column: 值列名
-        freq: 重采样频率，如'D'(天),'M'(月),'Y'(年)
+        date_column: 日期列名，填 'auto' 时使用自动识别出的第一个日期列
+        value_column: 值列名，或多个值列名的列表
+        freq: 重采样频率，如'D'(天),'W'(周),'M'(月),'Y'(年)，或多个频率的列表
 
     Returns:
         str: 时间序列分析结果
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
+    value_columns = [value_column] if isinstance(value_column, str) else value_column
+    freqs = [freq] if isinstance(freq, str) else freq
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
-        df[date_column] = pd.to_datetime(df[date_column])
-        df = df.set_index(date_column)
-
-        # 重采样并计算统计值
-        resampled = df[value_column].resample(freq).agg(["mean", "min", "max", "count"])
+        analyzer = excel_handler.get_chunked_analyzer(filepath)
+        if analyzer is not None:
+            if date_column in ("", "auto"):
+                raise ValueError("大文件流式处理时需要指定 date_column")
+            results = {
+                f: {
+                    col: analyzer.time_series(date_column, col, f)
+                    for col in value_columns
+                }
+                for f in freqs
+            }
+        else:
+            # 日期列按文件版本只解析一次，不同频率的重采样结果相互复用
+            results = timeseries.analyze(
+                excel_handler, filepath, sheet_name, date_column, value_columns, freqs
+            )
 
-        return f"时间序列分析结果（频率：{freq}）：\n{resampled.to_string()}"
+        sections = []
+        for f, by_column in results.items():
+            if len(by_column) == 1:
+                resampled = next(iter(by_column.values()))
+            else:
+                resampled = pd.concat(by_column, axis=1)
+            sections.append(f"时间序列分析结果（频率：{f}）：\n{resampled.to_string()}")
+        return "\n\n".join(sections)
     except Exception as e:
         logger.error(f"时间序列分析时出错: {e}")
         raise
 
 
 @mcp.tool()
-def get_random_sample(filepath: str, sheet_name: str, sample_size: int) -> str:
+@tool_executor.offload
+def get_random_sample(
+    filepath: str,
+    sheet_name: str,
+    sample_size: int,
+    seed: Optional[int] = None,
+    stratify_by: Optional[str] = None,
+) -> str:
     """获取Excel或CSV文件中的随机采样数据。
 
     Args:
         filepath: 目标文件的相对或绝对路径
         sheet_name: 要采样的工作表名称（对于CSV文件，此参数将被忽略）
         sample_size: 需要采样的行数
+        seed: 随机种子，传入相同的种子可以得到相同的样本，默认每次随机
+        stratify_by: 分层采样的列名，各取值按行数比例分配样本，默认不分层
 
     Returns:
         str: 包含随机采样数据的字符串表示
@@ -545,11 +582,8 @@ def get_random_sample(filepath: str, sheet_name: str, sample_size: int) -> str:
     """
     excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
     try:
-        df = excel_handler.read_data(
-            excel_handler.get_file_path(filepath), sheet_name=sheet_name
-        )
         sample_df = excel_handler.get_random_sample(
-            df, sample_size, sheet_name=sheet_name
+            filepath, sheet_name, sample_size, seed, stratify_by
         )
 
         return sample_df.to_json(orient="records", force_ascii=False)
@@ -558,12 +592,85 @@ def get_random_sample(filepath: str, sheet_name: str, sample_size: int) -> str:
         raise
 
 
+@mcp.tool()
+@tool_executor.offload
+def batch_analyze(
+    filepath: str, sheet_name: str, operations: List[Dict[str, Any]]
+) -> str:
+    """在一次调用中对同一个工作表执行多个分析操作，数据只读取一次。
+    观察数据时优先使用此工具，一次完成列信息、缺失值、唯一值、统计和抽样。
+
+    Args:
+        filepath: 目标文件的相对或绝对路径
+        sheet_name: 要分析的工作表名称（对于CSV文件，此参数将被忽略）
+        operations: 操作列表，每项为包含 op 字段及其参数的字典，按顺序执行，支持：
+            {"op": "columns"}: 列名和数据类型
+            {"op": "missing"}: 每列缺失值数量和缺失率
+            {"op": "unique", "columns": [...], "max_unique": 10}: 唯一值分布，columns 可省略
+            {"op": "numeric_stats", "columns": [...]}: 数值统计，columns 可省略
+            {"op": "group_stats", "group_by": "列名", "agg_columns": [...], "agg_functions": ["mean", "count"], "top_n": 50, "offset": 0}: 分组统计，group_by 可以是列名列表
+            {"op": "sample", "sample_size": 5, "seed": 0, "stratify_by": "列名"}: 随机采样，不超过20行，seed、stratify_by 可省略
+            {"op": "correlations", "method": "pearson", "min_correlation": 0.5}: 数值列相关性
+
+    Returns:
+        str: 按操作顺序拼接的结果，单个操作失败时对应部分为错误信息
+    """
+    excel_handler = ExcelHandler(path.join(EXCEL_FILES_PATH, ""))
+    try:
+        results = excel_handler.run_batch(filepath, sheet_name, operations)
+        return "\n\n".join(
+            f"### {i}. {op}\n{output}" for i, (op, output) in enumerate(results, 1)
+        )
+    except Exception as e:
+        logger.error(f"批量分析时出错: {e}")
+        raise
+
+
+@mcp.tool()
+def get_server_cache_stats() -> str:
+    """获取服务器内部缓存的命中、未命中和淘汰统计，用于排查性能和内存问题。
+
+    Returns:
+        str: 每个缓存的条目数、占用字节、命中率和淘汰次数
+    """
+    lines = []
+    for name, stats in get_cache_stats().items():
+        lines.append(f"[{name}]")
+        lines.extend(f"    {k}: {v}" for k, v in stats.items())
+    return "\n".join(lines)
+
+
+@mcp.tool()
+def get_server_pool_stats() -> str:
+    """获取工具工作池的排队深度、运行数量和平均耗时，用于排查并发性能问题。
+
+    Returns:
+        str: 工作池配置以及每个工具的排队、运行和完成统计
+    """
+    stats = tool_executor.stats()
+    lines = [f"{k}: {v}" for k, v in stats.items() if k != "tools"]
+    for name, tool_stats in stats["tools"].items():
+        lines.append(f"[{name}]")
+        lines.extend(f"    {k}: {v}" for k, v in tool_stats.items())
+    sandbox = get_sandbox()
+    if sandbox is not None:
+        lines.append("[代码沙箱]")
+        lines.extend(f"    {k}: {v}" for k, v in sandbox.stats().items())
+    return "\n".join(lines)
+
+
 async def run_server():
     """启动Excel和CSV文件处理MCP服务器。"""
     try:
         logger.info(
             f"Starting Excel/CSV MCP server (files directory: {EXCEL_FILES_PATH})"
         )
+        # 启动时完成 matplotlib 导入和字体加载，第一次绘图不再承担这部分开销
+        await asyncio.to_thread(charts.warm_up)
+        sandbox = get_sandbox()
+        if sandbox is not None:
+            # 启动时预热沙箱进程，第一次代码调用不再承担导入开销
+            sandbox.warm_up()
         await mcp.run_sse_async()
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
@@ -572,4 +679,6 @@ async def run_server():
         logger.error(f"Server failed: {e}")
         raise
     finally:
+        tool_executor.shutdown()
+        shutdown_sandbox()
         logger.info("Server shutdown complete")
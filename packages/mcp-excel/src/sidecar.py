@@ -0,0 +1,206 @@
+import os
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .readers import project_frame, project_table
+
+logger = logging.getLogger("excel-mcp")
+
+_hash_lock = threading.Lock()
+# filepath -> (mtime, size, digest)，同一版本的文件只计算一次内容哈希
+_hash_memo: Dict[str, Tuple[float, int, str]] = {}
+
+
+def content_hash(filepath: str) -> str:
+    """计算文件内容哈希，按 (mtime, size) 记忆，避免重复读取大文件"""
+    stat = os.stat(filepath)
+    with _hash_lock:
+        memo = _hash_memo.get(filepath)
+        if memo and memo[0] == stat.st_mtime and memo[1] == stat.st_size:
+            return memo[2]
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hash_lock:
+        _hash_memo[filepath] = (stat.st_mtime, stat.st_size, value)
+    return value
+
+
+class SidecarCache:
+    """解析后工作表的磁盘列式缓存
+
+    每个工作表以未压缩的 Arrow IPC 文件保存，按固定行数切分为 record batch，
+    后续读取通过内存映射加载，跳过 Excel 解析。缓存键由文件内容哈希、工作表名称
+    和读取参数组成，文件内容变化后自然失效。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        enabled: bool = True,
+        max_bytes: int = 0,
+        batch_rows: int = 65536,
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录
+            enabled: 是否启用，未安装 pyarrow 时自动禁用
+            max_bytes: 磁盘预算，超过后删除最久未使用的缓存文件，0 表示不限制
+            batch_rows: 每个 record batch 的行数
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.batch_rows = batch_rows
+        self.enabled = enabled
+        if self.enabled:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                logger.warning("未安装 pyarrow，磁盘列式缓存已禁用")
+                self.enabled = False
+
+    @classmethod
+    def from_env(cls, files_path: str) -> "SidecarCache":
+        """根据环境变量创建缓存，默认目录为 EXCEL_FILES_PATH 同级的 .mcp-excel-cache"""
+        default_dir = os.path.join(
+            os.path.dirname(os.path.abspath(files_path.rstrip("/\\")) or "."),
+            ".mcp-excel-cache",
+        )
+        return cls(
+            cache_dir=os.environ.get("EXCEL_SIDECAR_PATH", default_dir),
+            enabled=os.environ.get("EXCEL_SIDECAR_ENABLED", "1").lower()
+            not in ("0", "false", "no"),
+            max_bytes=int(os.environ.get("EXCEL_SIDECAR_MAX_MB", "10240"))
+            * 1024
+            * 1024,
+        )
+
+    def path_for(
+        self, filepath: str, sheet_name: Optional[str], read_kwargs: Dict[str, Any]
+    ) -> str:
+        """返回缓存文件路径"""
+        params = hashlib.blake2b(
+            repr((sheet_name, sorted(read_kwargs.items()))).encode("utf-8"),
+            digest_size=8,
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{content_hash(filepath)}-{params}.arrow")
+
+    def load(
+        self,
+        filepath: str,
+        sheet_name: Optional[str],
+        read_kwargs: Dict[str, Any],
+        columns: Optional[List[str]] = None,
+        filters=None,
+    ) -> Optional[pd.DataFrame]:
+        """读取缓存，未命中或读取失败时返回 None
+
+        指定 columns / filters 时只有被选中的列和行会从内存映射转换为 pandas
+
+        Raises:
+            KeyError: 投影或过滤引用的列不在工作表中，此时重新解析工作簿也无济于事
+        """
+        if not self.enabled:
+            return None
+        import pyarrow as pa
+
+        try:
+            path = self.path_for(filepath, sheet_name, read_kwargs)
+            if not os.path.exists(path):
+                return None
+            source = pa.memory_map(path, "r")
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"读取磁盘缓存失败 {filepath}: {e}")
+            return None
+        with source:
+            try:
+                table = pa.ipc.open_file(source).read_all()
+            except (OSError, pa.ArrowException) as e:
+                logger.warning(f"读取磁盘缓存失败 {filepath}: {e}")
+                return None
+            names = table.schema.names
+            needed = list(columns or []) + [c[0] for c in filters or []]
+            missing = [col for col in dict.fromkeys(needed) if col not in names]
+            if missing:
+                raise KeyError(f"列 {missing} 不存在，可用列: {names}")
+            try:
+                projected = project_table(table, columns, filters)
+                if projected is None:
+                    df = project_frame(table.to_pandas(), columns, filters)
+                else:
+                    df = projected.to_pandas()
+            except (OSError, pa.ArrowException) as e:
+                logger.warning(f"读取磁盘缓存失败 {filepath}: {e}")
+                return None
+        # 更新访问时间，供磁盘预算淘汰使用
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        logger.info(f"命中磁盘缓存 {path}")
+        return df
+
+    def store(
+        self,
+        filepath: str,
+        sheet_name: Optional[str],
+        read_kwargs: Dict[str, Any],
+        df: pd.DataFrame,
+    ) -> Optional[str]:
+        """写入缓存，无法转换为 Arrow 的数据（如混合类型列）会被跳过"""
+        if not self.enabled or not isinstance(df, pd.DataFrame):
+            return None
+        # Arrow 会把列名转为字符串，非字符串列名无法原样还原
+        if not all(isinstance(col, str) for col in df.columns):
+            return None
+        try:
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(df, preserve_index=None)
+            path = self.path_for(filepath, sheet_name, read_kwargs)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with pa.OSFile(tmp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=self.batch_rows)
+            os.replace(tmp_path, path)
+            self._enforce_budget()
+            return path
+        except Exception as e:
+            logger.warning(f"写入磁盘缓存失败 {filepath}: {e}")
+            return None
+
+    def _enforce_budget(self) -> None:
+        if self.max_bytes <= 0:
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".arrow"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+
+
+_sidecars: Dict[str, SidecarCache] = {}
+
+
+def get_sidecar(files_path: str) -> SidecarCache:
+    """获取文件目录对应的磁盘缓存实例"""
+    if files_path not in _sidecars:
+        _sidecars[files_path] = SidecarCache.from_env(files_path)
+    return _sidecars[files_path]
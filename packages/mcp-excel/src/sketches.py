@@ -0,0 +1,126 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog:
+    """HyperLogLog 基数估计，用于超大列的近似唯一值计数
+
+    哈希使用 pandas.util.hash_pandas_object，整列向量化计算；
+    精度 p=14 时内存占用 16KB，标准误差约 0.8%。
+    """
+
+    def __init__(self, p: int = 14):
+        if not 4 <= p <= 18:
+            raise ValueError("p 必须在 4 到 18 之间")
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """添加一批 64 位哈希值"""
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # frexp 的指数即为剩余位的有效位数，rank 为前导零个数加一
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values: pd.Series) -> "HyperLogLog":
+        """添加一列数据，缺失值会被忽略"""
+        values = values.dropna()
+        if len(values):
+            self.add_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """合并另一个相同精度的估计器，用于分块或并行计算"""
+        if other.p != self.p:
+            raise ValueError("只能合并相同精度的 HyperLogLog")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """返回估计的唯一值数量"""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # 小基数时使用线性计数修正
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+def top_k_counts(values: pd.Series, k: int) -> Tuple[list, List[int], int]:
+    """统计非空列的高频值，只输出 k 个结果
+
+    先用 pd.factorize 把值哈希编码为整数，再用 np.bincount 计数，
+    最后用 np.partition 选出第 k 大的计数，不对全部唯一值排序，也不把它们转换为 Python 对象。
+    计数相同时按首次出现的顺序排列，结果是确定的。
+
+    Args:
+        values: 不含缺失值的列
+        k: 保留的高频值数量
+
+    Returns:
+        (高频值列表, 对应的出现次数, 唯一值数量)
+    """
+    codes, uniques = pd.factorize(values, sort=False)
+    counts = np.bincount(codes, minlength=len(uniques))
+    distinct = len(uniques)
+    if distinct > k > 0:
+        kth = np.partition(counts, distinct - k)[distinct - k]
+        above = np.flatnonzero(counts > kth)
+        ties = np.flatnonzero(counts == kth)[: k - len(above)]
+        index = np.concatenate([above, ties])
+    else:
+        index = np.arange(distinct if k > 0 else 0)
+    # factorize 的编码即首次出现的顺序，作为计数相同时的次序
+    index = index[np.lexsort((index, -counts[index]))]
+    return uniques.take(index).tolist(), counts[index].tolist(), distinct
+
+
+def _benchmark(rows: int = 2000000, k: int = 10) -> None:
+    """对比 value_counts 排序后截取、unique().tolist() 与 top_k_counts 的耗时"""
+    import time
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(
+        {
+            "高基数文本": pd.Series(rng.integers(0, rows // 4, rows)).map(
+                lambda x: f"id{x}"
+            ),
+            "低基数文本": rng.choice(["北京", "上海", "广州"], rows),
+            "整数": rng.integers(0, 1000000, rows),
+            "浮点数": rng.random(rows),
+        }
+    )
+    for col in frame.columns:
+        values = frame[col]
+        start = time.perf_counter()
+        values.unique().tolist()
+        unique_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        values.value_counts(sort=True).head(k)
+        value_counts_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        top_k_counts(values, k)
+        top_k_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        HyperLogLog().update(values).count()
+        hll_seconds = time.perf_counter() - start
+        print(
+            f"{col}: unique().tolist() {unique_seconds:.3f}s，"
+            f"value_counts {value_counts_seconds:.3f}s，"
+            f"top_k_counts {top_k_seconds:.3f}s，HyperLogLog {hll_seconds:.3f}s"
+        )
+
+
+# 高频值统计基准: python -m src.sketches
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,262 @@
+import os
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from .data_handlers import NUMERIC_STAT_NAMES, is_numeric_column
+from .groupby import group_keys
+
+logger = logging.getLogger("excel-mcp")
+
+# 超过该大小的 CSV 文件按块流式处理，不再整体载入内存
+STREAMING_THRESHOLD_BYTES = (
+    int(os.environ.get("EXCEL_STREAMING_THRESHOLD_MB", "512")) * 1024 * 1024
+)
+STREAMING_CHUNK_ROWS = int(os.environ.get("EXCEL_STREAMING_CHUNK_ROWS", "200000"))
+# 估计分位数时每列保留的样本数量
+QUANTILE_RESERVOIR_SIZE = 50000
+
+# 分组统计中可以跨块合并的聚合函数
+MERGEABLE_AGG_FUNCTIONS = ("sum", "count", "min", "max", "mean", "std", "var")
+
+
+def should_stream(filepath: str) -> bool:
+    """判断文件是否需要流式处理"""
+    return (
+        filepath.lower().endswith(".csv")
+        and os.path.getsize(filepath) >= STREAMING_THRESHOLD_BYTES
+    )
+
+
+class _Reservoir:
+    """基于随机优先级的蓄水池采样，用于近似分位数，可跨块合并"""
+
+    def __init__(self, size: int, rng: np.random.Generator):
+        self.size = size
+        self.rng = rng
+        self.values = np.empty(0, dtype=np.float64)
+        self.keys = np.empty(0, dtype=np.float64)
+
+    def add(self, values: np.ndarray) -> None:
+        keys = np.concatenate([self.keys, self.rng.random(len(values))])
+        values = np.concatenate([self.values, values])
+        if len(values) > self.size:
+            keep = np.argpartition(keys, self.size)[: self.size]
+            keys, values = keys[keep], values[keep]
+        self.keys, self.values = keys, values
+
+
+class ChunkedCSVAnalyzer:
+    """按块读取大型 CSV 文件，合并每块的部分结果，峰值内存与文件大小无关"""
+
+    def __init__(self, filepath: str, chunk_rows: int = STREAMING_CHUNK_ROWS):
+        self.filepath = filepath
+        self.chunk_rows = chunk_rows
+
+    def iter_chunks(
+        self, columns: Optional[List[str]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """逐块读取 CSV 文件
+
+        Args:
+            columns: 只读取的列，None 表示读取所有列
+        """
+        with pd.read_csv(
+            self.filepath, chunksize=self.chunk_rows, usecols=columns
+        ) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def missing_values(self) -> Dict[str, Any]:
+        """统计每列的缺失值数量，返回与列画像相同结构的字典"""
+        rows = 0
+        null_counts: Optional[pd.Series] = None
+        for chunk in self.iter_chunks():
+            rows += len(chunk)
+            counts = chunk.isnull().sum()
+            null_counts = counts if null_counts is None else null_counts.add(counts)
+        return {
+            "rows": rows,
+            "columns": {
+                col: {"null_count": int(count)}
+                for col, count in (
+                    null_counts if null_counts is not None else {}
+                ).items()
+            },
+        }
+
+    def numeric_stats(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """计算数值列的 describe() 统计及总和
+
+        均值和标准差使用 Chan 并行算法跨块合并，分位数基于蓄水池样本近似计算
+        """
+        rng = np.random.default_rng(0)
+        acc: Dict[str, Dict[str, Any]] = {}
+        for chunk in self.iter_chunks(columns):
+            if not acc:
+                names = columns or [
+                    c for c in chunk.columns if is_numeric_column(chunk[c])
+                ]
+                acc = {
+                    col: {
+                        "count": 0,
+                        "mean": 0.0,
+                        "m2": 0.0,
+                        "min": np.inf,
+                        "max": -np.inf,
+                        "sum": 0.0,
+                        "reservoir": _Reservoir(QUANTILE_RESERVOIR_SIZE, rng),
+                    }
+                    for col in names
+                }
+            for col, state in acc.items():
+                values = pd.to_numeric(chunk[col], errors="coerce").dropna()
+                values = values.to_numpy(dtype=np.float64)
+                n = len(values)
+                if n == 0:
+                    continue
+                mean = values.mean()
+                m2 = ((values - mean) ** 2).sum()
+                total = state["count"] + n
+                delta = mean - state["mean"]
+                state["m2"] += m2 + delta * delta * state["count"] * n / total
+                state["mean"] += delta * n / total
+                state["count"] = total
+                state["min"] = min(state["min"], values.min())
+                state["max"] = max(state["max"], values.max())
+                state["sum"] += values.sum()
+                state["reservoir"].add(values)
+
+        stats = {}
+        for col, state in acc.items():
+            count = state["count"]
+            if count:
+                q25, q50, q75 = np.quantile(
+                    state["reservoir"].values, [0.25, 0.5, 0.75]
+                )
+            else:
+                q25 = q50 = q75 = np.nan
+            stats[col] = [
+                float(count),
+                state["mean"] if count else np.nan,
+                np.sqrt(state["m2"] / (count - 1)) if count > 1 else np.nan,
+                state["min"] if count else np.nan,
+                q25,
+                q50,
+                q75,
+                state["max"] if count else np.nan,
+                state["sum"],
+            ]
+        return pd.DataFrame(stats, index=NUMERIC_STAT_NAMES)
+
+    def group_stats(
+        self,
+        group_by: Union[str, List[str]],
+        agg_columns: List[str],
+        agg_functions: List[str],
+    ) -> pd.DataFrame:
+        """分块计算分组统计并合并，只支持可合并的聚合函数"""
+        unsupported = [f for f in agg_functions if f not in MERGEABLE_AGG_FUNCTIONS]
+        if unsupported:
+            raise ValueError(
+                f"大文件流式分组统计不支持 {unsupported}，"
+                f"可用的聚合函数: {list(MERGEABLE_AGG_FUNCTIONS)}"
+            )
+        keys = group_keys(group_by)
+        acc: Optional[Dict[str, pd.DataFrame]] = None
+        for chunk in self.iter_chunks(list(dict.fromkeys(keys + agg_columns))):
+            values = chunk[agg_columns].apply(pd.to_numeric, errors="coerce")
+            # 按原始列分组，分组键同时是统计列时统计列保持数值转换后的结果
+            grouped = values.groupby([chunk[k] for k in keys])
+            count = grouped.count()
+            part = {
+                "count": count,
+                "sum": grouped.sum(),
+                "min": grouped.min(),
+                "max": grouped.max(),
+                "mean": grouped.mean(),
+                "m2": grouped.var(ddof=0).fillna(0.0) * count,
+            }
+            acc = part if acc is None else self._merge_group_partials(acc, part)
+        if acc is None:
+            raise ValueError("文件中没有数据行")
+
+        count = acc["count"]
+        var = (acc["m2"] / (count - 1)).where(count > 1)
+        derived = {
+            "sum": acc["sum"],
+            "count": count.astype("int64"),
+            "min": acc["min"],
+            "max": acc["max"],
+            "mean": acc["mean"].where(count > 0),
+            "var": var,
+            "std": np.sqrt(var),
+        }
+        result = pd.concat(
+            {
+                (col, func): derived[func][col]
+                for col in agg_columns
+                for func in agg_functions
+            },
+            axis=1,
+        )
+        result.index.names = keys
+        return result.sort_index()
+
+    @staticmethod
+    def _merge_group_partials(
+        acc: Dict[str, pd.DataFrame], part: Dict[str, pd.DataFrame]
+    ) -> Dict[str, pd.DataFrame]:
+        """合并两份按组的部分结果，均值和 M2 使用与 numeric_stats 相同的 Chan 公式"""
+        index = acc["count"].index.union(part["count"].index)
+        a = {name: frame.reindex(index) for name, frame in acc.items()}
+        b = {name: frame.reindex(index) for name, frame in part.items()}
+        n_a = a["count"].fillna(0)
+        n_b = b["count"].fillna(0)
+        total = n_a + n_b
+        mean_a = a["mean"].fillna(0.0)
+        delta = b["mean"].fillna(0.0) - mean_a
+        # 没有有效值的组不参与合并，避免除以 0
+        weight = (n_b / total.where(total > 0)).fillna(0.0)
+        return {
+            "count": total,
+            "sum": a["sum"].add(b["sum"], fill_value=0.0),
+            "min": np.fmin(a["min"], b["min"]),
+            "max": np.fmax(a["max"], b["max"]),
+            "mean": mean_a + delta * weight,
+            "m2": a["m2"].fillna(0.0)
+            + b["m2"].fillna(0.0)
+            + delta * delta * n_a * weight,
+        }
+
+    def time_series(
+        self, date_column: str, value_column: str, freq: str
+    ) -> pd.DataFrame:
+        """分块重采样并合并，返回每个周期的 mean、min、max、count"""
+        partials = []
+        for chunk in self.iter_chunks([date_column, value_column]):
+            series = pd.Series(
+                pd.to_numeric(chunk[value_column], errors="coerce").to_numpy(),
+                index=pd.to_datetime(chunk[date_column]),
+            )
+            series = series[series.index.notna()]
+            if len(series):
+                partials.append(
+                    series.resample(freq).agg(["sum", "count", "min", "max"])
+                )
+        if not partials:
+            return pd.DataFrame(columns=["mean", "min", "max", "count"])
+        merged = (
+            pd.concat(partials)
+            .groupby(level=0)
+            .agg({"sum": "sum", "count": "sum", "min": "min", "max": "max"})
+            # 再次重采样以补齐各块之间的空周期
+            .resample(freq)
+            .agg({"sum": "sum", "count": "sum", "min": "min", "max": "max"})
+        )
+        merged["mean"] = merged["sum"] / merged["count"].replace(0, np.nan)
+        result = merged[["mean", "min", "max", "count"]]
+        result.index.name = date_column
+        return result
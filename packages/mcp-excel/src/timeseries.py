@@ -0,0 +1,219 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import MonthEnd, QuarterEnd, Tick, YearEnd
+
+from .cache import MemoryCache
+
+logger = logging.getLogger("excel-mcp")
+
+# 解析并排序后的时间索引，每个 (文件, 修改时间, 工作表, 日期列) 一份
+time_index_cache = MemoryCache.from_env(
+    "time_index",
+    prefix="EXCEL_TIME_INDEX_CACHE",
+    max_mb=256,
+    max_entries=64,
+    sizeof=lambda entry: int(entry[0].nbytes + entry[1].nbytes),
+)
+
+# 重采样的部分聚合结果 (sum, count, min, max)，每个 (文件, 修改时间, 工作表, 日期列, 值列)
+# 保存一个 {频率: 结果} 字典，较粗的频率可以由已缓存的较细频率合并得到
+resample_cache = MemoryCache.from_env(
+    "resample",
+    prefix="EXCEL_RESAMPLE_CACHE",
+    max_mb=64,
+    max_entries=512,
+    sizeof=lambda partials: int(
+        sum(df.memory_usage(index=True).sum() for df in partials.values())
+    ),
+)
+
+# 自动识别日期列时，可解析为日期的非空值比例下限和检查的样本行数
+DATE_DETECT_RATIO = 0.9
+DATE_DETECT_SAMPLE_ROWS = 1000
+
+_DAY_NANOS = 24 * 3600 * 10**9
+_PARTIAL_AGGS = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+_partials_lock = threading.Lock()
+
+
+def _looks_like_dates(series: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        # 纯数字列不当作日期，避免把金额、编号等误识别为时间戳
+        return False
+    sample = series.dropna().head(DATE_DETECT_SAMPLE_ROWS)
+    if sample.empty:
+        return False
+    parsed = pd.to_datetime(sample.astype(str), errors="coerce", format="mixed")
+    return parsed.notna().mean() >= DATE_DETECT_RATIO
+
+
+def detect_date_columns(handler, filepath: str, sheet_name: Optional[str]) -> List[str]:
+    """识别工作表中可以解析为日期的列，结果随列画像按文件版本缓存"""
+    from .data_handlers import schema_cache
+
+    full_path = handler.get_file_path(filepath)
+    key = (full_path, os.path.getmtime(full_path), "date_columns", sheet_name)
+    columns = schema_cache.get(key)
+    if columns is None:
+        df = handler.read_data(full_path, sheet_name=sheet_name, readonly=True)
+        columns = [col for col in df.columns if _looks_like_dates(df[col])]
+        schema_cache.put(key, columns)
+    return list(columns)
+
+
+def get_time_index(
+    handler, filepath: str, sheet_name: Optional[str], date_column: str
+) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+    """获取日期列解析后的有序时间索引
+
+    Returns:
+        (按时间排序的 DatetimeIndex, 对应的原始行位置)，无法解析的日期所在行被丢弃
+    """
+    full_path = handler.get_file_path(filepath)
+    key = (full_path, os.path.getmtime(full_path), sheet_name, date_column)
+    entry = time_index_cache.get(key)
+    if entry is None:
+        column = handler.read_data(
+            full_path, sheet_name=sheet_name, columns=[date_column], readonly=True
+        )[date_column]
+        dates = pd.DatetimeIndex(pd.to_datetime(column, errors="coerce"))
+        positions = np.flatnonzero(dates.notna())
+        order = np.argsort(dates[positions].asi8, kind="stable")
+        positions = positions[order]
+        entry = (dates[positions], positions)
+        time_index_cache.put(key, entry)
+    return entry
+
+
+def _nests(source, target) -> bool:
+    """判断 target 频率的每个区间是否恰好由若干个 source 频率的区间组成"""
+    if source == target:
+        return True
+    if isinstance(source, Tick):
+        if isinstance(target, Tick):
+            return target.nanos % source.nanos == 0
+        # 日历频率（周、月、季、年等）的区间边界都在零点
+        return _DAY_NANOS % source.nanos == 0
+    if source.n != 1 or target.n != 1:
+        return False
+    if isinstance(source, MonthEnd):
+        return isinstance(target, (QuarterEnd, YearEnd))
+    if isinstance(source, QuarterEnd):
+        return (
+            isinstance(target, YearEnd)
+            and (target.month - source.startingMonth) % 3 == 0
+        )
+    return False
+
+
+def _partial_resample(
+    handler,
+    filepath: str,
+    sheet_name: Optional[str],
+    date_column: str,
+    value_column: str,
+    freq: str,
+) -> pd.DataFrame:
+    """计算或复用某个频率下的 sum、count、min、max"""
+    offset = to_offset(freq)
+    full_path = handler.get_file_path(filepath)
+    key = (
+        full_path,
+        os.path.getmtime(full_path),
+        sheet_name,
+        date_column,
+        value_column,
+    )
+    with _partials_lock:
+        partials = dict(resample_cache.get(key) or {})
+    if offset.freqstr in partials:
+        return partials[offset.freqstr]
+
+    # 优先从已缓存的较细频率合并，选择行数最少的一个
+    candidates = [
+        partial
+        for cached_freq, partial in partials.items()
+        if _nests(to_offset(cached_freq), offset)
+    ]
+    if candidates:
+        source = min(candidates, key=len)
+        partial = source.resample(offset).agg(_PARTIAL_AGGS)
+    else:
+        index, positions = get_time_index(handler, filepath, sheet_name, date_column)
+        column = handler.read_data(
+            full_path, sheet_name=sheet_name, columns=[value_column], readonly=True
+        )[value_column]
+        values = pd.to_numeric(column, errors="coerce").to_numpy()[positions]
+        partial = (
+            pd.Series(values, index=index)
+            .resample(offset)
+            .agg(["sum", "count", "min", "max"])
+        )
+
+    with _partials_lock:
+        partials = dict(resample_cache.peek(key) or {})
+        partials[offset.freqstr] = partial
+        resample_cache.put(key, partials)
+    return partial
+
+
+def resample(
+    handler,
+    filepath: str,
+    sheet_name: Optional[str],
+    date_column: str,
+    value_column: str,
+    freq: str,
+) -> pd.DataFrame:
+    """按频率重采样，返回每个周期的 mean、min、max、count"""
+    partial = _partial_resample(
+        handler, filepath, sheet_name, date_column, value_column, freq
+    )
+    result = pd.DataFrame(
+        {
+            "mean": partial["sum"] / partial["count"].replace(0, np.nan),
+            "min": partial["min"],
+            "max": partial["max"],
+            "count": partial["count"].astype("int64"),
+        }
+    )
+    result.index.name = date_column
+    return result
+
+
+def analyze(
+    handler,
+    filepath: str,
+    sheet_name: Optional[str],
+    date_column: str,
+    value_columns: List[str],
+    freqs: List[str],
+) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """对多个值列、多个频率重采样，日期列 'auto' 表示使用识别出的第一个日期列
+
+    Returns:
+        {频率: {值列: 结果}}
+    """
+    if date_column in ("", "auto"):
+        detected = detect_date_columns(handler, filepath, sheet_name)
+        if not detected:
+            raise ValueError("未找到可以解析为日期的列，请指定 date_column")
+        date_column = detected[0]
+    return {
+        freq: {
+            value_column: resample(
+                handler, filepath, sheet_name, date_column, value_column, freq
+            )
+            for value_column in value_columns
+        }
+        for freq in freqs
+    }
@@ -0,0 +1,324 @@
+import os
+import sys
+import time
+import numbers
+import datetime
+import logging
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .cache import invalidate_file
+
+logger = logging.getLogger("excel-mcp")
+
+
+# 新建 Excel 文件使用的写入引擎：auto（优先 xlsxwriter 流式写入）、xlsxwriter 或 openpyxl
+XLSX_WRITER = os.environ.get("EXCEL_XLSX_WRITER", "auto").lower()
+# 流式写入时每次转换的行数，控制峰值内存
+WRITE_CHUNK_ROWS = 65536
+# Excel 单个工作表的最大行数
+EXCEL_MAX_ROWS = 1048576
+
+
+def _has_xlsxwriter() -> bool:
+    try:
+        import xlsxwriter  # noqa: F401
+
+        return True
+    except ImportError:
+        return False
+
+
+def output_format(filepath: str) -> str:
+    """根据扩展名判断输出格式：csv、parquet、feather 或 excel"""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext == ".feather":
+        return "feather"
+    return "excel"
+
+
+def _sheet_path(filepath: str, sheet_name: str) -> str:
+    """多工作表写入单表格式时，每个工作表写入 {文件名}-{工作表}{扩展名}"""
+    stem, ext = os.path.splitext(filepath)
+    return f"{stem}-{sheet_name}{ext}"
+
+
+# 与 df.to_excel 默认的 inf_rep 一致
+INF_REP = "inf"
+
+
+def _to_cell(value):
+    """按 pandas 写入 Excel 的规则转换单个值
+
+    NaN 为空单元格，正负无穷写为 inf / -inf，时间差写为天数，
+    xlsxwriter 不支持的类型（Period、Interval 等）写为字符串
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Real):
+        if isinstance(value, (float, np.floating)):
+            if np.isnan(value):
+                return None
+            if np.isinf(value):
+                return INF_REP if value > 0 else f"-{INF_REP}"
+        return value
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds() / 86400
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value
+    return str(value)
+
+
+def _cell_values(column: pd.Series) -> list:
+    """把一列转换为 xlsxwriter 可以直接写入的 Python 值，结果与 df.to_excel 写入的内容一致"""
+    dtype = column.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return column.tolist()
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        array = column.to_numpy()
+        if not np.isinf(array).any():
+            return column.astype(object).where(column.notna(), None).tolist()
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        column = column.dt.tz_localize(None)
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        days = column.dt.total_seconds() / 86400
+        return days.astype(object).where(days.notna(), None).tolist()
+    values = column.astype(object).where(column.notna(), None).tolist()
+    # 其余类型（object、Categorical、Period、可空整数等）逐个转换
+    return [_to_cell(v) for v in values]
+
+
+def _write_excel_streaming(filepath: str, frames: Dict[str, pd.DataFrame]) -> None:
+    """使用 xlsxwriter 的 constant_memory 模式逐行写入新文件
+
+    constant_memory 模式下每写完一行就刷新到临时文件，内存占用与行数无关，
+    但要求严格按行顺序写入。pandas 的 to_excel 按列逐个写入单元格，
+    在该模式下会丢失数据，因此这里按块转换后手动逐行写入。
+    """
+    import xlsxwriter
+
+    for sheet_name, df in frames.items():
+        if len(df) + 1 > EXCEL_MAX_ROWS:
+            raise ValueError(
+                f"工作表 {sheet_name} 共 {len(df)} 行，超过 Excel 的最大行数 "
+                f"{EXCEL_MAX_ROWS}，请改用 .csv 或 .parquet 输出"
+            )
+    workbook = xlsxwriter.Workbook(
+        filepath,
+        {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        },
+    )
+    try:
+        # 与 pandas 默认的表头样式一致
+        header_format = workbook.add_format(
+            {"bold": True, "border": 1, "align": "center", "valign": "top"}
+        )
+        for sheet_name, df in frames.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+            row = 1
+            for start in range(0, len(df), WRITE_CHUNK_ROWS):
+                chunk = df.iloc[start : start + WRITE_CHUNK_ROWS]
+                columns = [
+                    _cell_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])
+                ]
+                for values in zip(*columns):
+                    worksheet.write_row(row, 0, values)
+                    row += 1
+    finally:
+        workbook.close()
+
+
+def _write_excel(filepath: str, frames: Dict[str, pd.DataFrame], **kwargs) -> None:
+    """写入 Excel 文件，工作簿只打开和保存一次
+
+    已有文件使用 openpyxl 追加并替换同名工作表；新文件按 EXCEL_XLSX_WRITER 选择引擎，
+    默认使用 xlsxwriter 流式写入，传入 to_excel 参数时使用 pandas 写入
+    """
+    if os.path.exists(filepath):
+        writer = pd.ExcelWriter(
+            filepath, mode="a", engine="openpyxl", if_sheet_exists="replace"
+        )
+    else:
+        use_xlsxwriter = XLSX_WRITER != "openpyxl" and _has_xlsxwriter()
+        if use_xlsxwriter and not kwargs:
+            _write_excel_streaming(filepath, frames)
+            return
+        engine = "xlsxwriter" if use_xlsxwriter else "openpyxl"
+        writer = pd.ExcelWriter(filepath, mode="w", engine=engine)
+    with writer:
+        for sheet_name, df in frames.items():
+            df.to_excel(writer, sheet_name=sheet_name, index=False, **kwargs)
+
+
+def _write_csv(df: pd.DataFrame, target: str, **kwargs) -> None:
+    df.to_csv(target, index=False, **kwargs)
+
+
+def _write_parquet(df: pd.DataFrame, target: str, **kwargs) -> None:
+    df.to_parquet(target, index=False, **kwargs)
+
+
+def _write_feather(df: pd.DataFrame, target: str, **kwargs) -> None:
+    # feather 不保存索引，且要求默认的 RangeIndex
+    df.reset_index(drop=True).to_feather(target, **kwargs)
+
+
+# 单表格式的写入函数，按扩展名选择
+FILE_WRITERS = {
+    "csv": _write_csv,
+    "parquet": _write_parquet,
+    "feather": _write_feather,
+}
+
+
+def write_sheets(filepath: str, frames: Dict[str, pd.DataFrame], **kwargs) -> List[str]:
+    """一次性写入多个工作表
+
+    Excel 文件只打开和保存一次，见 _write_excel。CSV/Parquet/Feather 没有工作表的概念，
+    单个工作表直接写入目标路径，多个工作表分别写入 {文件名}-{工作表}{扩展名}。
+
+    Args:
+        filepath: 目标文件的绝对路径
+        frames: 工作表名称到 DataFrame 的映射
+        **kwargs: 额外的参数，会传递给 pandas 的写入函数
+
+    Returns:
+        List[str]: 实际写入的文件路径
+    """
+    fmt = output_format(filepath)
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    if fmt == "excel":
+        _write_excel(filepath, frames, **kwargs)
+        written = [filepath]
+    else:
+        written = []
+        for sheet_name, df in frames.items():
+            target = filepath if len(frames) == 1 else _sheet_path(filepath, sheet_name)
+            FILE_WRITERS[fmt](df, target, **kwargs)
+            written.append(target)
+    # 文件内容已变化，清理所有相关缓存
+    for target in written:
+        invalidate_file(target)
+    return written
+
+
+def _benchmark_frame(rows: int) -> pd.DataFrame:
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "日期": pd.date_range("2024-01-01", periods=rows, freq="min"),
+            "城市": rng.choice(["北京", "上海", "广州"], rows),
+            "销量": rng.integers(0, 100, rows),
+            "价格": rng.random(rows) * 100,
+            "备注": rng.choice(["a", "b", None], rows),
+        }
+    )
+
+
+def _benchmark(directory: str, sheets: int = 20, rows: int = 5000) -> None:
+    """对比逐个工作表追加写入与一次性写入 20 个工作表的耗时"""
+    frames = {f"表{i}": _benchmark_frame(rows) for i in range(sheets)}
+    os.makedirs(directory, exist_ok=True)
+
+    target = os.path.join(directory, "per_sheet.xlsx")
+    if os.path.exists(target):
+        os.remove(target)
+    start = time.perf_counter()
+    for sheet_name, df in frames.items():
+        # 原来的写法：每个工作表重新打开、重写整个工作簿
+        if os.path.exists(target):
+            with pd.ExcelWriter(
+                target, mode="a", engine="openpyxl", if_sheet_exists="replace"
+            ) as writer:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+        else:
+            with pd.ExcelWriter(target, mode="w", engine="openpyxl") as writer:
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    print(f"逐个工作表追加: {time.perf_counter() - start:.2f}s")
+
+    for name in ("bulk.xlsx", "bulk.csv", "bulk.parquet"):
+        target = os.path.join(directory, name)
+        if os.path.exists(target):
+            os.remove(target)
+        start = time.perf_counter()
+        write_sheets(target, frames)
+        print(f"一次性写入 {name}: {time.perf_counter() - start:.2f}s")
+
+
+def _measure_export(directory: str, writer: str, rows: int, queue) -> None:
+    import resource
+
+    df = _benchmark_frame(rows)
+    # Linux 下 ru_maxrss 的单位是 KB
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ext = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}.get(
+        writer, ".xlsx"
+    )
+    target = os.path.join(directory, f"export-{writer}{ext}")
+    if os.path.exists(target):
+        os.remove(target)
+    start = time.perf_counter()
+    if writer in ("openpyxl", "xlsxwriter"):
+        with pd.ExcelWriter(target, engine=writer) as excel_writer:
+            df.to_excel(excel_writer, sheet_name="Sheet1", index=False)
+    else:
+        write_sheets(target, {"Sheet1": df})
+    elapsed = time.perf_counter() - start
+    queue.put(
+        {
+            "writer": writer,
+            "seconds": round(elapsed, 2),
+            "peak_rss_delta_mb": round(
+                (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024,
+                1,
+            ),
+            "file_mb": round(os.path.getsize(target) / 1024 / 1024, 1),
+        }
+    )
+
+
+def benchmark_export(
+    directory: str,
+    rows: int = 500000,
+    writers=("openpyxl", "xlsxwriter", "streaming", "parquet", "feather"),
+) -> list:
+    """在独立子进程中用各写入方式导出同一份数据，比较耗时和写入期间的常驻内存增量
+
+    openpyxl / xlsxwriter 为 pandas 的 to_excel，streaming 为 constant_memory 流式写入
+    """
+    import multiprocessing
+
+    os.makedirs(directory, exist_ok=True)
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for writer in writers:
+        queue = ctx.Queue()
+        process = ctx.Process(
+            target=_measure_export, args=(directory, writer, rows, queue)
+        )
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+# 多工作表写入基准: python -m src.writers <输出目录>
+# 大结果导出基准: python -m src.writers <输出目录> <行数>
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "./benchmark-output"
+    if len(sys.argv) > 2:
+        for row in benchmark_export(output_dir, int(sys.argv[2])):
+            print(row)
+    else:
+        _benchmark(output_dir)
@@ -0,0 +1,36 @@
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from src.cache import MemoryCache, estimate_size
+from src.data_handlers import profile_dataframe
+
+
+def _profile(seed: int):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            f"列{i}": rng.choice([f"值{j}" * 5 for j in range(100)], 1000)
+            for i in range(30)
+        }
+    )
+    return profile_dataframe(df, top_k=50)
+
+
+def test_estimate_size_walks_nested_profile():
+    profile = _profile(0)
+    size = estimate_size(profile)
+    assert size > 10 * sys.getsizeof(profile)
+    assert size >= len(pickle.dumps(profile))
+
+
+def test_profile_budget_is_enforced():
+    """预算按画像序列化后的大小设置，浅层估算会让所有画像都留在缓存中"""
+    profile = _profile(0)
+    cache = MemoryCache("test_profile", max_bytes=int(len(pickle.dumps(profile)) * 2.5))
+    for seed in range(5):
+        cache.put(("data.xlsx", 0.0, f"Sheet{seed}"), _profile(seed))
+    assert len(cache) <= 2
+    assert cache.current_bytes <= cache.max_bytes
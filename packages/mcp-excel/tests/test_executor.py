@@ -0,0 +1,24 @@
+import asyncio
+
+from src.executor import ToolExecutor, _parse_limits
+
+
+def test_parse_limits_rejects_values_below_one():
+    limits = _parse_limits("a=2, b=0, c=-1, d=x, e=3")
+    assert limits == {"a": 2, "e": 3}
+
+
+def test_zero_limit_falls_back_to_default():
+    """tool=0 不应生成永远无法获取的信号量"""
+    executor = ToolExecutor(workers=2, limits=_parse_limits("slow=0"))
+
+    @executor.offload
+    def slow(x):
+        return x + 1
+
+    async def call():
+        return await asyncio.wait_for(slow(1), timeout=5)
+
+    assert asyncio.run(call()) == 2
+    assert executor._get_stats("slow").limit == 2
+    executor.shutdown()
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.groupby import top_groups
+
+
+@pytest.mark.parametrize("ascending", [False, True])
+def test_top_groups_object_sort_column(ascending):
+    """文本列的 first / min / max 结果是 object 类型，不能用 nlargest，按完整排序处理"""
+    grouped = pd.DataFrame(
+        {("name", "first"): list("bacd"), ("n", "sum"): [1, 2, 3, 4]}
+    )
+    page = top_groups(grouped, ("name", "first"), ascending=ascending, top_n=2)
+    expected = grouped.sort_values(
+        by=("name", "first"), ascending=ascending, kind="stable"
+    ).head(2)
+    pd.testing.assert_frame_equal(page, expected)
+
+
+def test_top_groups_numeric_partial_sort_matches_full_sort():
+    grouped = pd.DataFrame({("n", "sum"): [3.0, np.nan, 5.0, 1.0, 5.0]})
+    page = top_groups(grouped, ("n", "sum"), top_n=2, offset=1)
+    assert page[("n", "sum")].tolist() == [5.0, 3.0]
@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+
+from src.data_handlers import ExcelDataHandler
+
+MULTI_SHEET_CODE = """
+def main(df):
+    return {"汇总": df.groupby("城市", as_index=False)["销量"].sum(), "明细": df}
+"""
+
+
+def _handler(tmp_path) -> ExcelDataHandler:
+    pd.DataFrame({"城市": ["北京", "上海", "北京"], "销量": [1, 2, 3]}).to_csv(
+        tmp_path / "sales.csv", index=False
+    )
+    return ExcelDataHandler(os.path.join(str(tmp_path), ""))
+
+
+def test_multi_sheet_csv_reports_written_files(tmp_path):
+    """CSV 没有工作表，多个结果分别写入 {文件名}-{工作表}.csv，返回信息列出实际文件"""
+    handler = _handler(tmp_path)
+    result = handler.run_code(
+        "sales.csv", MULTI_SHEET_CODE, None, "out/result.csv", "Sheet1"
+    )
+    assert result == "执行完成 out/result-汇总.csv, out/result-明细.csv"
+    assert not (tmp_path / "out" / "result.csv").exists()
+    summary = pd.read_csv(tmp_path / "out" / "result-汇总.csv")
+    assert summary.set_index("城市")["销量"].to_dict() == {"上海": 2, "北京": 4}
+    assert len(pd.read_csv(tmp_path / "out" / "result-明细.csv")) == 3
+
+
+def test_single_result_reports_target(tmp_path):
+    """单个结果直接写入 result_file_path"""
+    handler = _handler(tmp_path)
+    result = handler.run_code(
+        "sales.csv", "def main(df):\n    return df", None, "out/result.csv", "Sheet1"
+    )
+    assert result == "执行完成 out/result.csv"
+    assert (tmp_path / "out" / "result.csv").exists()
+
+
+def test_user_code_keeps_default_pandas_semantics(tmp_path):
+    """服务不全局开启写时复制，用户代码中的链式赋值照常生效，且不会修改缓存"""
+    handler = _handler(tmp_path)
+    full_path = handler.get_file_path("sales.csv")
+    cached = handler.read_data(full_path, sheet_name="Sheet1", readonly=True)
+    code = """
+def main(df):
+    df["销量"][df["城市"] == "北京"] = 0
+    return df
+"""
+    assert not pd.get_option("mode.copy_on_write")
+    result = handler.run_code("sales.csv", code, "Sheet1", "out/result.csv")
+    assert result == "执行完成 out/result.csv"
+    assert pd.read_csv(tmp_path / "out" / "result.csv")["销量"].tolist() == [0, 2, 0]
+    assert cached["销量"].tolist() == [1, 2, 3]
+    reread = handler.read_data(full_path, sheet_name="Sheet1", readonly=True)
+    assert reread["销量"].tolist() == [1, 2, 3]
+
+
+def test_read_all_sheets_returns_copies(tmp_path):
+    """sheet_name=None 读取所有工作表时缓存的是字典，每个工作表分别复制"""
+    path = tmp_path / "book.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"a": [1, 2]}).to_excel(writer, sheet_name="一", index=False)
+        pd.DataFrame({"b": [3]}).to_excel(writer, sheet_name="二", index=False)
+    handler = ExcelDataHandler(os.path.join(str(tmp_path), ""))
+    for readonly in (False, True):
+        sheets = handler.read_data(str(path), sheet_name=None, readonly=readonly)
+        assert list(sheets) == ["一", "二"]
+        assert sheets["一"]["a"].tolist() == [1, 2]
+    sheets["一"]["a"] = 0
+    sheets = handler.read_data(str(path), sheet_name=None)
+    sheets["二"].loc[0, "b"] = 9
+    assert handler.read_data(str(path), sheet_name=None)["二"]["b"].tolist() == [3]
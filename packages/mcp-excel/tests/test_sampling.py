@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xlsxwriter
+
+from src import data_handlers
+from src.data_handlers import ExcelDataHandler
+from src.sampling import sample_csv_lines, sample_excel_rows
+
+
+@pytest.fixture
+def handler(tmp_path):
+    data_handlers.dataframe_cache.invalidate()
+    return ExcelDataHandler(os.path.join(str(tmp_path), ""))
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """重复表头、空表头、中间和末尾的空行、只在少数行出现的缺失值和文本"""
+    path = str(tmp_path / "data.xlsx")
+    book = xlsxwriter.Workbook(path)
+    sheet = book.add_worksheet("数据")
+    bold = book.add_format({"bold": True})
+    sheet.write_row(0, 1, ["城市", "城市", None, "数量", "编号"])
+    for i in range(40):
+        sheet.write_row(i + 1, 1, [f"城市{i % 3}", "北京", 1.5 * i, i, str(i)])
+    sheet.write_blank(20, 4, None, bold)
+    sheet.write_string(30, 5, "未知")
+    for row in (10, 42, 43):
+        for col in range(1, 6):
+            sheet.write_blank(row, col, None, bold)
+    book.close()
+    return path
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    rows = ["城市,城市,数量,编号"]
+    rows += [f"城市{i % 3},北京,{i},{i}" for i in range(40)]
+    rows[21] = "城市2,北京,,20"
+    rows[31] = "城市0,北京,30,未知"
+    path = tmp_path / "data.csv"
+    path.write_text("\n".join(rows) + "\n\n", encoding="utf-8")
+    return str(path)
+
+
+def test_excel_full_sample_matches_read_data(handler, workbook):
+    expected = handler.read_data(workbook, sheet_name="数据")
+    sample = sample_excel_rows(
+        workbook, "数据", len(expected), np.random.default_rng(0)
+    )
+    pd.testing.assert_frame_equal(sample, expected)
+
+
+@pytest.mark.parametrize("stratify_by", [None, "城市"])
+def test_excel_sample_uses_whole_column_dtypes(handler, workbook, stratify_by):
+    expected = handler.read_data(workbook, sheet_name="数据")
+    sample = sample_excel_rows(
+        workbook, "数据", 5, np.random.default_rng(1), stratify_by
+    )
+    assert len(sample) == 5
+    pd.testing.assert_series_equal(sample.dtypes, expected.dtypes)
+    assert list(sample.columns) == [
+        "Unnamed: 0",
+        "城市",
+        "城市.1",
+        "Unnamed: 3",
+        "数量",
+        "编号",
+    ]
+
+
+def test_csv_sample_uses_whole_column_dtypes(handler, csv_file):
+    expected = handler.read_data(csv_file)
+    full = sample_csv_lines(handler, csv_file, len(expected), np.random.default_rng(0))
+    pd.testing.assert_frame_equal(full, expected)
+    rng = np.random.default_rng(2)
+    sample = sample_csv_lines(handler, csv_file, 5, rng)
+    pd.testing.assert_series_equal(sample.dtypes, expected.dtypes)
+    assert all(isinstance(value, str) for value in sample["编号"])
+
+
+def test_csv_sample_reuses_frame_cached_under_sheet_name(
+    handler, csv_file, monkeypatch
+):
+    """工具以工作表名称读取 CSV 后，采样直接使用缓存的完整数据"""
+    handler.read_data(handler.get_file_path("data.csv"), sheet_name="数据")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("不应重新读取文件")
+
+    monkeypatch.setattr("src.sampling.sample_csv_lines", fail)
+    monkeypatch.setattr("src.sampling.sample_csv_stream", fail)
+    sample = handler.get_random_sample("data.csv", "数据", 3, seed=0)
+    assert len(sample) == 3
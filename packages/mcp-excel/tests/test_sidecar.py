@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from src.sidecar import SidecarCache
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def cached(tmp_path):
+    source = tmp_path / "data.xlsx"
+    source.write_bytes(b"workbook")
+    sidecar = SidecarCache(str(tmp_path / "cache"))
+    df = pd.DataFrame({"城市": ["北京", "上海"], "销量": [1, 2]})
+    path = sidecar.store(str(source), "数据", {}, df)
+    return sidecar, str(source), path
+
+
+def test_load_projection(cached):
+    sidecar, source, _ = cached
+    df = sidecar.load(
+        source, "数据", {}, columns=["销量"], filters=[("城市", "==", "上海")]
+    )
+    assert df["销量"].tolist() == [2]
+
+
+def test_missing_column_raises_instead_of_miss(cached, monkeypatch):
+    """缺失的列不是缓存未命中，调用方不应因此重新解析工作簿并重写缓存"""
+    sidecar, source, _ = cached
+    with pytest.raises(KeyError, match="不存在的列"):
+        sidecar.load(source, "数据", {}, columns=["不存在的列"])
+    with pytest.raises(KeyError):
+        sidecar.load(source, "数据", {}, filters=[("不存在的列", "==", 1)])
+
+
+def test_corrupt_file_is_a_miss(cached):
+    sidecar, source, path = cached
+    with open(path, "wb") as f:
+        f.write(b"not arrow")
+    assert sidecar.load(source, "数据", {}) is None
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.streaming import ChunkedCSVAnalyzer
+
+
+@pytest.fixture
+def large_offset_csv(tmp_path):
+    """均值很大、组内波动很小的数据，平方和公式在这里会发生灾难性抵消"""
+    rng = np.random.default_rng(0)
+    rows = 5000
+    df = pd.DataFrame(
+        {
+            "城市": rng.choice(["北京", "上海", "广州"], rows),
+            "等级": rng.integers(1, 4, rows),
+            "金额": 1e8 + rng.random(rows) * 1e-2,
+        }
+    )
+    df.loc[rng.choice(rows, 50, replace=False), "金额"] = np.nan
+    path = tmp_path / "large.csv"
+    df.to_csv(path, index=False)
+    return path, pd.read_csv(path)
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 333, 100000])
+def test_group_stats_matches_pandas(large_offset_csv, chunk_rows):
+    path, df = large_offset_csv
+    functions = ["sum", "count", "min", "max", "mean", "std", "var"]
+    result = ChunkedCSVAnalyzer(str(path), chunk_rows=chunk_rows).group_stats(
+        ["城市", "等级"], ["金额"], functions
+    )
+    expected = df.groupby(["城市", "等级"])[["金额"]].agg(functions)
+    assert (result[("金额", "var")] > 0).all()
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-6)
+
+
+def test_group_stats_key_also_aggregated(tmp_path):
+    df = pd.DataFrame({"等级": [1, 1, 2, 2, 2, 3], "金额": [1.0, 2, 3, 4, 5, 6]})
+    path = tmp_path / "keys.csv"
+    df.to_csv(path, index=False)
+    result = ChunkedCSVAnalyzer(str(path), chunk_rows=2).group_stats(
+        "等级", ["等级", "金额"], ["sum", "count", "std"]
+    )
+    expected = df.groupby("等级")[["等级", "金额"]].agg(["sum", "count", "std"])
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_group_stats_prefers_backend_over_analyzer(tmp_path, monkeypatch):
+    """配置了分区后端时由后端完成分组统计，不创建分块分析器"""
+    from src.data_handlers import ExcelDataHandler
+
+    handler = ExcelDataHandler(str(tmp_path))
+    sentinel = pd.DataFrame({"x": [1]})
+
+    class Backend:
+        def group_stats(self, *args):
+            return sentinel
+
+    def no_analyzer(filepath):
+        raise AssertionError("不应创建分块分析器")
+
+    monkeypatch.setattr(handler, "get_backend", lambda filepath: Backend())
+    monkeypatch.setattr(handler, "get_chunked_analyzer", no_analyzer)
+    result = handler.compute_group_stats("big.csv", None, "a", ["b"], ["sum"])
+    assert result is sentinel
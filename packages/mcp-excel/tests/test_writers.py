@@ -0,0 +1,80 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import writers
+from src.writers import write_sheets
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def _cells(filepath: str, sheet_name: str) -> list:
+    worksheet = openpyxl.load_workbook(filepath)[sheet_name]
+    return [[cell.value for cell in row] for row in worksheet.iter_rows()]
+
+
+def _mixed_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "比例": [1.5, np.inf, -np.inf, np.nan],
+            "月份": pd.period_range("2024-01", periods=4, freq="M"),
+            "类别": pd.Categorical(["a", "b", None, "a"]),
+            "数量": pd.array([1, None, 3, 4], dtype="Int64"),
+            "标记": pd.array([True, None, False, True], dtype="boolean"),
+            "时长": pd.to_timedelta([1, 2, None, 4], unit="h"),
+            "区间": pd.interval_range(0, 4),
+            "文本": pd.array(["x", None, "z", "w"], dtype="string"),
+            "日期": pd.to_datetime(
+                [
+                    "2024-01-01 00:00:00",
+                    None,
+                    "2024-03-01 12:00:00",
+                    "2024-04-01 00:00:00",
+                ]
+            ),
+            "混合": ["a", 1, datetime.date(2024, 1, 1), {"k": 1}],
+            "整数": np.arange(4),
+        }
+    )
+
+
+@pytest.mark.parametrize("column", list(_mixed_frame().columns))
+def test_streaming_writer_matches_to_excel(tmp_path, monkeypatch, column):
+    """新文件的流式写入与 df.to_excel 写入的单元格内容一致"""
+    monkeypatch.setattr("src.writers.XLSX_WRITER", "auto")
+    df = _mixed_frame()[[column]]
+    expected = tmp_path / "expected.xlsx"
+    df.to_excel(expected, sheet_name="数据", index=False, engine="xlsxwriter")
+
+    target = tmp_path / "actual.xlsx"
+    write_sheets(str(target), {"数据": df})
+
+    assert _cells(str(target), "数据") == _cells(str(expected), "数据")
+
+
+def test_streaming_writer_multiple_sheets(tmp_path):
+    """多个工作表一次写入同一个新文件"""
+    frames = {"a": _mixed_frame(), "b": _mixed_frame().head(2)}
+    target = tmp_path / "out.xlsx"
+    assert write_sheets(str(target), frames) == [str(target)]
+    assert openpyxl.load_workbook(target).sheetnames == ["a", "b"]
+    assert len(_cells(str(target), "b")) == 3
+
+
+def test_new_workbook_takes_streaming_path(tmp_path, monkeypatch):
+    """xlsxwriter 是声明的依赖，新文件必须走 constant_memory 流式写入而不是回退到 openpyxl"""
+    monkeypatch.setattr("src.writers.XLSX_WRITER", "auto")
+    calls = []
+    streaming = writers._write_excel_streaming
+
+    def spy(filepath, frames):
+        calls.append(filepath)
+        streaming(filepath, frames)
+
+    monkeypatch.setattr("src.writers._write_excel_streaming", spy)
+    target = str(tmp_path / "out.xlsx")
+    write_sheets(target, {"数据": _mixed_frame()})
+    assert writers._has_xlsxwriter()
+    assert calls == [target]